@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+基准测试：/posts 与 /sections 列表接口，ORM + Pydantic（旧路径）对比 Core 直出 JSON（新路径）
+
+在临时 SQLite 数据库里造 100 个 post（每个 3 条 media）和 100 个 section，
+统计每页请求的 SQL 条数和耗时，并确认两条路径输出完全一致。
+用法：python bench_list_endpoints.py [--items 100] [--repeat 50]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+import crud, models, schemas
+
+def seed(db, items: int) -> int:
+    story = models.Story(title="Bench")
+    db.add(story)
+    db.flush()
+    for i in range(items):
+        post = models.Post(title=f"Post {i}", content="x" * 2000, author="bench")
+        db.add(post)
+        db.flush()
+        for j in range(3):
+            db.add(models.Media(post_id=post.id, kind="image", url=f"/media/{i}-{j}.jpg", caption="c", sort_order=j))
+        db.add(models.Section(story_id=story.id, type="paragraph", data=json.dumps({"type": "paragraph", "content": "y" * 500}), sort_order=i))
+    db.commit()
+    return story.id
+
+def orm_posts(db, items):
+    return [schemas.PostRead.model_validate(p).model_dump(mode="json") for p in crud.get_posts(db, limit=items)]
+
+def orm_sections(db, items, story_id):
+    return [schemas.SectionRead.model_validate(s).model_dump(mode="json") for s in crud.get_sections(db, story_id=story_id, limit=items)]
+
+def run(label, fn, session_factory, repeat):
+    queries = []
+    def count(*args):
+        queries.append(args[2])
+    engine = session_factory.kw["bind"]
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        db = session_factory()
+        result = fn(db)
+        db.close()
+        per_call = len(queries)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db = session_factory()
+            fn(db)
+            db.close()
+        elapsed = (time.perf_counter() - start) / repeat
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    print(f"{label:<28} {per_call:>8} {elapsed * 1000:>10.2f}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        story_id = seed(db, args.items)
+        db.close()
+
+        n = args.items
+        print(f"{'path':<28} {'queries':>8} {'ms/page':>10}")
+        before = run("/posts ORM + pydantic", lambda db: orm_posts(db, n), Session, args.repeat)
+        after = run("/posts Core fast path", lambda db: crud.list_posts_json(db, limit=n), Session, args.repeat)
+        assert before == after, "posts output differs"
+        before = run("/sections ORM + pydantic", lambda db: orm_sections(db, n, story_id), Session, args.repeat)
+        after = run("/sections Core fast path", lambda db: crud.list_sections_json(db, story_id=story_id, limit=n), Session, args.repeat)
+        assert before == after, "sections output differs"
+        engine.dispose()
+    print("\n[OK] outputs identical")
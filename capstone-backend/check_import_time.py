@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+冷启动检查：在全新的解释器里 `import main`，耗时必须低于预算。
+
+数据库地址指向一个不可达的地址，如果 import 时还在连接数据库，就会超时失败。
+用法：python check_import_time.py [--budget 秒] [--runs 次数]；pytest 通过 tests/test_import_time.py 运行同一检查。
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "1.5"))
+
+MEASURE = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+def measure(runs: int) -> float:
+    env = dict(os.environ)
+    env.pop("USE_SQLITE", None)
+    env["DB_HOST"] = "203.0.113.1"  # TEST-NET-3, never routable
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", MEASURE],
+            cwd=Path(__file__).resolve().parent,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"import main failed:\n{out.stderr}")
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    # 取最小值，排除首次编译 .pyc 和机器抖动
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=IMPORT_TIME_BUDGET_SECONDS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        best = measure(args.runs)
+    except RuntimeError as exc:
+        sys.exit(str(exc))
+    print(f"import main: {best:.3f}s (budget {args.budget:.3f}s)")
+    if best > args.budget:
+        sys.exit(1)
@@ -1,7 +1,35 @@
+from sqlalchemy import func, literal_column, or_, select, update
 from sqlalchemy.orm import Session
-from typing import Optional
+from datetime import datetime
+from typing import Iterable, Optional
 import models, schemas
 import json
+from payloads import MEDIA_URL_MAX_LENGTH, UPLOADS_URL_PREFIX, collect_media_urls, media_reference_keys, normalize_media_url
+
+class VersionConflict(Exception):
+    """Raised when an If-Match row version no longer matches the stored row."""
+    def __init__(self, current_version: int):
+        super().__init__(f"row_version is {current_version}")
+        self.current_version = current_version
+
+def conditional_update(db: Session, model, obj_id: int, expected_version: Optional[int] = None, values: Optional[dict] = None) -> bool:
+    """Apply values and bump row_version in a single UPDATE ... WHERE id = ? [AND row_version = ?].
+
+    Returns False when the row does not exist; raises VersionConflict when it exists
+    with a different row_version. The row stays locked until the caller commits.
+    """
+    stmt = update(model).where(model.id == obj_id)
+    if expected_version is not None:
+        stmt = stmt.where(model.row_version == expected_version)
+    stmt = stmt.values(**(values or {}), row_version=model.row_version + 1)
+    result = db.execute(stmt)
+    if result.rowcount == 1:
+        return True
+    db.rollback()
+    current = db.query(model.row_version).filter(model.id == obj_id).scalar()
+    if current is None:
+        return False
+    raise VersionConflict(current)
 
 def reorder_sections(db: Session, story_id: int, moving_section: Optional[models.Section] = None, target_index: Optional[int] = None):
     """Rebuild sequential sort_order, optionally inserting a moving section at target_index."""
@@ -36,6 +64,7 @@ def create_post(db: Session, post: schemas.PostCreate) -> models.Post:
             sort_order=m.sort_order if m.sort_order is not None else i
         )
         db.add(media)
+    set_media_references(db, "post", db_post.id, [m.url for m in post.media])
     db.commit()
     db.refresh(db_post)
     return db_post
@@ -46,27 +75,29 @@ def get_posts(db: Session, skip: int = 0, limit: int = 50):
 def get_post(db: Session, post_id: int):
     return db.query(models.Post).filter(models.Post.id == post_id).first()
 
-def delete_post(db: Session, post_id: int) -> bool:
-    post = get_post(db, post_id)
-    if not post:
+def delete_post(db: Session, post_id: int, expected_version: Optional[int] = None) -> bool:
+    if not conditional_update(db, models.Post, post_id, expected_version):
         return False
+    post = get_post(db, post_id)
     db.delete(post)
+    set_media_references(db, "post", post_id, [])
     db.commit()
     return True
 
-def update_post(db: Session, post_id: int, payload: schemas.PostUpdate):
-    post = get_post(db, post_id)
-    if not post:
-        return None
+def update_post(db: Session, post_id: int, payload: schemas.PostUpdate, expected_version: Optional[int] = None):
     # scalar fields
+    values = {}
     if payload.title is not None:
-        post.title = payload.title
+        values["title"] = payload.title
     if payload.content is not None:
-        post.content = payload.content
+        values["content"] = payload.content
     if payload.author is not None:
-        post.author = payload.author
+        values["author"] = payload.author
     if payload.created_at is not None:
-        post.created_at = payload.created_at
+        values["created_at"] = payload.created_at
+    if not conditional_update(db, models.Post, post_id, expected_version, values):
+        return None
+    post = get_post(db, post_id)
 
     # full replace media if provided
     if payload.media is not None:
@@ -85,11 +116,63 @@ def update_post(db: Session, post_id: int, payload: schemas.PostUpdate):
                 sort_order=m.sort_order if m.sort_order is not None else i
             )
             db.add(media)
+        set_media_references(db, "post", post.id, [m.url for m in payload.media])
 
     db.commit()
     db.refresh(post)
     return post
 
+# List fast path: Core queries straight to JSON-ready dicts (no ORM hydration)
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _rows_to_dicts(rows, fields) -> list:
+    """Build dicts in the response model's field order, serialized like pydantic would."""
+    return [{name: _json_value(row[name]) for name in fields} for row in rows]
+
+def list_posts_json(db: Session, skip: int = 0, limit: int = 100, view: str = "full") -> list:
+    """Same output as List[PostRead] / List[PostSummary], in at most two queries.
+
+    The summary view selects only its own columns, so content and media are never read.
+    """
+    model = schemas.PostSummary if view == "summary" else schemas.PostRead
+    post_fields = [name for name in model.model_fields if name != "media"]
+    post_table = models.Post.__table__
+    rows = db.execute(
+        select(*(post_table.c[name] for name in post_fields))
+        .order_by(post_table.c.id)
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+    posts = _rows_to_dicts(rows, post_fields)
+    if view == "summary" or not posts:
+        return posts
+
+    media_fields = list(schemas.MediaRead.model_fields)
+    media_table = models.Media.__table__
+    media_by_post = {post["id"]: [] for post in posts}
+    post_media_rows = db.execute(
+        select(media_table.c.post_id, *(media_table.c[name] for name in media_fields))
+        .where(media_table.c.post_id.in_(list(media_by_post)))
+        .order_by(media_table.c.post_id, media_table.c.sort_order, media_table.c.id)
+    ).mappings().all()
+    for row in post_media_rows:
+        media_by_post[row["post_id"]].append({name: _json_value(row[name]) for name in media_fields})
+    for post in posts:
+        post["media"] = media_by_post[post["id"]]
+    return posts
+
+def list_sections_json(db: Session, story_id: Optional[int] = None, skip: int = 0, limit: int = 100, view: str = "full") -> list:
+    """Same output as List[SectionRead] / List[SectionSummary], in one query."""
+    model = schemas.SectionSummary if view == "summary" else schemas.SectionRead
+    fields = list(model.model_fields)
+    table = models.Section.__table__
+    stmt = select(*(table.c[name] for name in fields))
+    if story_id is not None:
+        stmt = stmt.where(table.c.story_id == story_id)
+    rows = db.execute(stmt.order_by(table.c.sort_order).offset(skip).limit(limit)).mappings().all()
+    return _rows_to_dicts(rows, fields)
+
 # Story CRUD
 def create_story(db: Session, story: schemas.StoryCreate) -> models.Story:
     db_story = models.Story(
@@ -103,6 +186,7 @@ def create_story(db: Session, story: schemas.StoryCreate) -> models.Story:
     db.flush()  # so we have db_story.id
     
     # add sections
+    db_sections = []
     for i, section in enumerate(story.sections):
         db_section = models.Section(
             story_id=db_story.id,
@@ -111,6 +195,10 @@ def create_story(db: Session, story: schemas.StoryCreate) -> models.Story:
             sort_order=section.sort_order if section.sort_order is not None else i
         )
         db.add(db_section)
+        db_sections.append(db_section)
+    db.flush()
+    for db_section in db_sections:
+        set_media_references(db, "section", db_section.id, section_media_urls(db_section.data))
     
     db.commit()
     db.refresh(db_story)
@@ -125,31 +213,32 @@ def get_story(db: Session, story_id: int):
 def get_latest_story(db: Session):
     return db.query(models.Story).order_by(models.Story.created_at.desc()).first()
 
-def delete_story(db: Session, story_id: int) -> bool:
-    story = get_story(db, story_id)
-    if not story:
+def delete_story(db: Session, story_id: int, expected_version: Optional[int] = None) -> bool:
+    if not conditional_update(db, models.Story, story_id, expected_version):
         return False
+    story = get_story(db, story_id)
+    for section in story.sections:
+        set_media_references(db, "section", section.id, [])
     db.delete(story)
     db.commit()
     return True
 
-def update_story(db: Session, story_id: int, payload: schemas.StoryUpdate) -> Optional[models.Story]:
-    story = get_story(db, story_id)
-    if not story:
-        return None
+def update_story(db: Session, story_id: int, payload: schemas.StoryUpdate, expected_version: Optional[int] = None) -> Optional[models.Story]:
+    values = {}
     if payload.title is not None:
-        story.title = payload.title
+        values["title"] = payload.title
     if payload.version is not None:
-        story.version = payload.version
+        values["version"] = payload.version
     if payload.standfirst is not None:
-        story.standfirst = payload.standfirst
+        values["standfirst"] = payload.standfirst
     if payload.theme_font is not None:
-        story.theme_font = payload.theme_font
+        values["theme_font"] = payload.theme_font
     if payload.theme_primary_color is not None:
-        story.theme_primary_color = payload.theme_primary_color
+        values["theme_primary_color"] = payload.theme_primary_color
+    if not conditional_update(db, models.Story, story_id, expected_version, values):
+        return None
     db.commit()
-    db.refresh(story)
-    return story
+    return get_story(db, story_id)
 
 # Section CRUD
 def get_sections(db: Session, story_id: Optional[int] = None, skip: int = 0, limit: int = 100):
@@ -158,6 +247,41 @@ def get_sections(db: Session, story_id: Optional[int] = None, skip: int = 0, lim
         query = query.filter(models.Section.story_id == story_id)
     return query.order_by(models.Section.sort_order).offset(skip).limit(limit).all()
 
+def _section_media_url_filter(url: str):
+    """Sections referencing url anywhere: data_src column or the media_references index."""
+    normalized = normalize_media_url(url)
+    referenced = select(models.MediaReference.owner_id).where(
+        models.MediaReference.owner_type == "section",
+        models.MediaReference.url == normalized,
+    )
+    return or_(
+        models.Section.data_src.in_({url, normalized}),
+        models.Section.id.in_(referenced),
+    )
+
+def _json_flag(db: Session, path: str, enabled: bool):
+    """data.<path> is JSON true / false, on native MySQL JSON or SQLite JSON1."""
+    extracted = func.json_extract(models.Section.data, path)
+    if db.get_bind().dialect.name == "mysql":
+        return extracted == literal_column(f"CAST('{'true' if enabled else 'false'}' AS JSON)")
+    return extracted == (1 if enabled else 0)
+
+def search_sections(db: Session, media_url: Optional[str] = None, layout: Optional[str] = None, autoplay: Optional[bool] = None, story_id: Optional[int] = None, limit: int = 100) -> list:
+    """Same output as List[SectionSummary]; selects only the summary columns, never data."""
+    fields = list(schemas.SectionSummary.model_fields)
+    table = models.Section.__table__
+    stmt = select(*(table.c[name] for name in fields))
+    if media_url:
+        stmt = stmt.where(_section_media_url_filter(media_url))
+    if layout is not None:
+        stmt = stmt.where(table.c.data_layout == layout)
+    if autoplay is not None:
+        stmt = stmt.where(table.c.type == "video", _json_flag(db, "$.autoplay", autoplay))
+    if story_id is not None:
+        stmt = stmt.where(table.c.story_id == story_id)
+    rows = db.execute(stmt.order_by(table.c.story_id, table.c.sort_order).limit(limit)).mappings().all()
+    return _rows_to_dicts(rows, fields)
+
 def get_section(db: Session, section_id: int):
     return db.query(models.Section).filter(models.Section.id == section_id).first()
 
@@ -171,18 +295,22 @@ def create_section(db: Session, section: schemas.SectionCreate, story_id: int) -
     db.add(db_section)
     db.flush()
     reorder_sections(db, story_id, db_section, section.sort_order)
+    set_media_references(db, "section", db_section.id, section_media_urls(db_section.data))
     db.commit()
     db.refresh(db_section)
     return db_section
 
-def update_section(db: Session, section_id: int, section_type: str = None, data: str = None, sort_order: int = None) -> models.Section:
-    section = get_section(db, section_id)
-    if not section:
-        return None
+def update_section(db: Session, section_id: int, section_type: str = None, data: str = None, sort_order: int = None, expected_version: Optional[int] = None) -> models.Section:
+    values = {}
     if section_type is not None:
-        section.type = section_type
+        values["type"] = section_type
     if data is not None:
-        section.data = data
+        values["data"] = data
+    if not conditional_update(db, models.Section, section_id, expected_version, values):
+        return None
+    section = get_section(db, section_id)
+    if data is not None:
+        set_media_references(db, "section", section_id, section_media_urls(data))
     if sort_order is not None:
         section.sort_order = sort_order
         db.flush()
@@ -193,13 +321,187 @@ def update_section(db: Session, section_id: int, section_type: str = None, data:
     db.refresh(section)
     return section
 
-def delete_section(db: Session, section_id: int) -> Optional[int]:
-    section = get_section(db, section_id)
-    if not section:
+def patch_section_data(db: Session, section_id: int, apply_patch, expected_version: Optional[int] = None, retries: int = 3) -> Optional[models.Section]:
+    """Apply apply_patch(parsed_data) to a section's data inside the write transaction.
+
+    The write is a conditional UPDATE on the row_version that was read, so a
+    concurrent writer can never be overwritten; without If-Match the patch is
+    simply re-applied to the fresh data.
+    """
+    for attempt in range(retries):
+        row = (
+            db.query(models.Section.data, models.Section.row_version)
+            .filter(models.Section.id == section_id)
+            .first()
+        )
+        if row is None:
+            return None
+        if expected_version is not None and row.row_version != expected_version:
+            raise VersionConflict(row.row_version)
+        try:
+            current = json.loads(row.data or "{}")
+        except json.JSONDecodeError:
+            current = {}
+        merged = apply_patch(current)
+        if not isinstance(merged, dict):
+            raise ValueError("Patched section data must be a JSON object")
+        values = {"data": json.dumps(merged, ensure_ascii=False)}
+        if isinstance(merged.get("type"), str):
+            values["type"] = merged["type"]
+        try:
+            if not conditional_update(db, models.Section, section_id, row.row_version, values):
+                return None
+        except VersionConflict:
+            if expected_version is not None or attempt == retries - 1:
+                raise
+            continue
+        set_media_references(db, "section", section_id, collect_media_urls(merged))
+        db.commit()
+        return get_section(db, section_id)
+
+def delete_section(db: Session, section_id: int, expected_version: Optional[int] = None) -> Optional[int]:
+    if not conditional_update(db, models.Section, section_id, expected_version):
         return None
+    section = get_section(db, section_id)
     story_id = section.story_id
     db.delete(section)
+    set_media_references(db, "section", section_id, [])
     db.flush()
     reorder_sections(db, story_id)
     db.commit()
     return story_id
+
+def get_section_order(db: Session, story_id: int) -> list:
+    """Return section ids of a story in display order."""
+    rows = (
+        db.query(models.Section.id)
+        .filter(models.Section.story_id == story_id)
+        .order_by(models.Section.sort_order.asc(), models.Section.id.asc())
+        .all()
+    )
+    return [row.id for row in rows]
+
+def get_story_fingerprint(db: Session, story_id: int) -> Optional[tuple]:
+    """Cheap change marker for a story: its row_version plus (id, row_version) of each section in order.
+
+    Returns None when the story does not exist.
+    """
+    story_version = db.query(models.Story.row_version).filter(models.Story.id == story_id).scalar()
+    if story_version is None:
+        return None
+    rows = (
+        db.query(models.Section.id, models.Section.row_version)
+        .filter(models.Section.story_id == story_id)
+        .order_by(models.Section.sort_order.asc(), models.Section.id.asc())
+        .all()
+    )
+    return (story_version, tuple((row.id, row.row_version) for row in rows))
+
+def get_latest_story_id(db: Session, story_ids: Optional[Iterable[int]] = None) -> Optional[int]:
+    """Id of the story /story serves (newest created_at), optionally among story_ids only."""
+    query = db.query(models.Story.id)
+    if story_ids is not None:
+        query = query.filter(models.Story.id.in_(list(story_ids)))
+    return query.order_by(models.Story.created_at.desc()).limit(1).scalar()
+
+# Story events
+def create_story_event(db: Session, story_id: int, kind: str, data: dict) -> models.StoryEvent:
+    event = models.StoryEvent(story_id=story_id, kind=kind, data=json.dumps(data, ensure_ascii=False))
+    db.add(event)
+    db.commit()
+    return event
+
+def get_story_events(db: Session, story_id: int, after_id: int = 0, since: Optional[datetime] = None, limit: int = 500):
+    """Events after after_id, plus (when since is given) every event created at or after since.
+
+    The extra window lets readers catch events whose id was allocated earlier but
+    committed later than one they already saw; callers drop the ids they have sent.
+    """
+    newer = models.StoryEvent.id > after_id
+    if since is not None:
+        newer = or_(newer, models.StoryEvent.created_at >= since)
+    return (
+        db.query(models.StoryEvent)
+        .filter(models.StoryEvent.story_id == story_id, newer)
+        .order_by(models.StoryEvent.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+def prune_story_events(db: Session, before: datetime) -> int:
+    """Delete events created before `before`; returns the number of rows removed."""
+    deleted = (
+        db.query(models.StoryEvent)
+        .filter(models.StoryEvent.created_at < before)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+def get_last_story_event_id(db: Session, story_id: int) -> int:
+    last = (
+        db.query(models.StoryEvent.id)
+        .filter(models.StoryEvent.story_id == story_id)
+        .order_by(models.StoryEvent.id.desc())
+        .first()
+    )
+    return last.id if last else 0
+
+# Media references & uploads
+def section_media_urls(data: Optional[str]) -> list:
+    """Media URLs referenced by a section's JSON string (empty if it is not valid JSON)."""
+    try:
+        parsed = json.loads(data or "{}")
+    except json.JSONDecodeError:
+        return []
+    return collect_media_urls(parsed) if isinstance(parsed, dict) else []
+
+def set_media_references(db: Session, owner_type: str, owner_id: int, urls: Iterable[str]) -> None:
+    """Replace the media references of one owner; runs inside the caller's transaction."""
+    db.query(models.MediaReference).filter(
+        models.MediaReference.owner_type == owner_type,
+        models.MediaReference.owner_id == owner_id,
+    ).delete(synchronize_session=False)
+    for url in dict.fromkeys(key for u in urls for key in media_reference_keys(u)):
+        db.add(models.MediaReference(owner_type=owner_type, owner_id=owner_id, url=url))
+
+def get_media_references(db: Session, url: str):
+    return db.query(models.MediaReference).filter(models.MediaReference.url == normalize_media_url(url)).all()
+
+def record_upload(db: Session, url: str, size: int) -> Optional[models.Upload]:
+    """Insert or refresh the upload record; re-uploading a path restarts its grace period.
+
+    Only files under /media/uploads/ are GC candidates; other targets (demo media,
+    story.json, ...) are not recorded and None is returned.
+    """
+    url = normalize_media_url(url)
+    if not url.startswith(UPLOADS_URL_PREFIX):
+        return None
+    upload = db.query(models.Upload).filter(models.Upload.url == url).first()
+    if upload is None:
+        upload = models.Upload(url=url)
+        db.add(upload)
+    upload.size = size
+    upload.created_at = datetime.utcnow()
+    db.commit()
+    return upload
+
+# Media metadata
+METADATA_FIELDS = ("format", "width", "height", "duration", "size")
+
+def upsert_media_metadata(db: Session, url: str, info: dict, commit: bool = True) -> Optional[models.MediaMetadata]:
+    url = normalize_media_url(url)
+    if len(url) > MEDIA_URL_MAX_LENGTH:
+        return None
+    row = db.query(models.MediaMetadata).filter(models.MediaMetadata.url == url).first()
+    if row is None:
+        row = models.MediaMetadata(url=url)
+        db.add(row)
+    for field in METADATA_FIELDS:
+        setattr(row, field, info.get(field))
+    if commit:
+        db.commit()
+    return row
+
+def get_media_metadata_urls(db: Session) -> set:
+    return {row.url for row in db.query(models.MediaMetadata.url)}
@@ -4,6 +4,8 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 
 # 在 Render 等云端，把 USE_SQLITE 设置为 "true"，
 # 本地 / Docker 不设置（默认 false），仍然用 MySQL。
+# 无论哪种数据库，启动 uvicorn 之前都要先运行 `python migrate.py`（建表 + 增量迁移）；
+# 应用 import 时不再建表。
 USE_SQLITE = os.getenv("USE_SQLITE", "false").lower() == "true"
 
 if USE_SQLITE:
@@ -0,0 +1,116 @@
+"""Story 变更流：写路径提交后记录事件，SSE 接口按事件 id 增量推送。
+
+事件保存在数据库的 story_events 表里，所以多个 uvicorn worker 之间天然共享：
+任何 worker 写入的事件，其他 worker 上的订阅者轮询时都能读到。
+
+自增 id 按分配顺序而不是提交顺序递增：并发写入时，较小 id 的事件可能晚于较大 id 提交。
+所以每次轮询除了 id > cursor 的事件，还会重读最近 LATE_COMMIT_SECONDS 内创建的事件，
+按 id 去重后补发。事件只保留 RETENTION_HOURS，写路径每 PRUNE_EVERY 条顺带清理一次。
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import crud, models
+from database import SessionLocal
+
+POLL_INTERVAL = float(os.getenv("STORY_EVENTS_POLL_SECONDS", "1.0"))
+KEEPALIVE_INTERVAL = 15.0
+LATE_COMMIT_SECONDS = float(os.getenv("STORY_EVENTS_LATE_COMMIT_SECONDS", "10"))
+RETENTION_HOURS = float(os.getenv("STORY_EVENTS_RETENTION_HOURS", "24"))
+PRUNE_EVERY = 100
+
+logger = logging.getLogger(__name__)
+
+
+def publish(db: Session, story_id: int, kind: str, data: dict) -> None:
+    """Record a change event; failures are logged and never break the write."""
+    try:
+        event = crud.create_story_event(db, story_id, kind, data)
+        if event.id % PRUNE_EVERY == 0:
+            crud.prune_story_events(db, datetime.utcnow() - timedelta(hours=RETENTION_HOURS))
+    except Exception as exc:
+        db.rollback()
+        logger.warning("Failed to publish %s for story %s: %s", kind, story_id, exc)
+
+
+def section_event_data(section: models.Section, include_data: bool = False) -> dict:
+    data = {
+        "id": section.id,
+        "type": section.type,
+        "sort_order": section.sort_order,
+        "row_version": section.row_version,
+    }
+    if include_data:
+        data["data"] = section.data
+    return data
+
+
+def format_event(event: models.StoryEvent, event_id: Optional[int] = None) -> str:
+    """SSE frame; event_id overrides the frame id so Last-Event-ID never moves backwards."""
+    payload = {
+        "story_id": event.story_id,
+        **json.loads(event.data or "{}"),
+    }
+    frame_id = event.id if event_id is None else event_id
+    return f"id: {frame_id}\nevent: {event.kind}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _late_commit_since() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=LATE_COMMIT_SECONDS)
+
+
+def _start_cursor(story_id: int, last_event_id: Optional[int]) -> Tuple[int, Set[int]]:
+    """Cursor to resume from, plus the recent event ids the client is assumed to have seen."""
+    db = SessionLocal()
+    try:
+        cursor = crud.get_last_story_event_id(db, story_id) if last_event_id is None else last_event_id
+        recent = crud.get_story_events(db, story_id, after_id=cursor, since=_late_commit_since())
+        return cursor, {event.id for event in recent if event.id <= cursor}
+    finally:
+        db.close()
+
+
+def _fetch_events(story_id: int, cursor: int, delivered: Set[int]):
+    """Frames for events not yet sent; returns (new cursor, ids still inside the re-read window, frames)."""
+    db = SessionLocal()
+    try:
+        events = crud.get_story_events(db, story_id, after_id=cursor, since=_late_commit_since())
+        frames = []
+        for event in events:
+            if event.id in delivered:
+                continue
+            cursor = max(cursor, event.id)
+            frames.append(format_event(event, cursor))
+        return cursor, {event.id for event in events}, frames
+    finally:
+        db.close()
+
+
+async def stream(story_id: int, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+    """Yield SSE frames for a story, resuming after last_event_id when given.
+
+    新订阅者只关心之后的变更；断线重连时，重连前窗口内 id <= Last-Event-ID 的事件视为已收到。
+    """
+    cursor, delivered = await run_in_threadpool(_start_cursor, story_id, last_event_id)
+    yield f"retry: {int(POLL_INTERVAL * 1000)}\n\n"
+
+    idle = 0.0
+    while True:
+        cursor, delivered, frames = await run_in_threadpool(_fetch_events, story_id, cursor, delivered)
+        for frame in frames:
+            yield frame
+        if frames:
+            idle = 0.0
+            continue
+        await asyncio.sleep(POLL_INTERVAL)
+        idle += POLL_INTERVAL
+        if idle >= KEEPALIVE_INTERVAL:
+            idle = 0.0
+            yield ": keepalive\n\n"
@@ -1,82 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Body, Depends, HTTPException, UploadFile, File, Query, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from pathlib import Path, PurePosixPath
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import hashlib
 import json
 import os
-import shutil
 import uuid
 import logging
-import models, schemas, crud
-from database import SessionLocal, engine, Base
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Posts Backend", version="1.0.0")
-
-backend_dir = Path(__file__).resolve().parent
-project_root = backend_dir.parent
-
-def _discover_default_story_path() -> Path:
-    """Locate a sensible default story.json when env var is not provided.
-
-    Preference order:
-      1. capstone-frontend/public/story.json inside the current project
-      2. capstone-frontend/public/story.json one directory above (GitHub Classroom root)
-      3. capstone-backend/public/story.json if it exists
-    """
-    candidate_public_dirs = [
-        project_root / "capstone-frontend" / "public",
-        project_root.parent / "capstone-frontend" / "public",
-        backend_dir / "public",
-    ]
-
-    # 如果这些目录里已经有 story.json，就直接用
-    for public_dir in candidate_public_dirs:
-        story_path = public_dir / "story.json"
-        if story_path.exists():
-            return story_path
-
-    # 如果目录存在但还没有 story.json，就先返回一个“将来会放在这里”的路径
-    for public_dir in candidate_public_dirs:
-        if public_dir.is_dir():
-            return public_dir / "story.json"
-
-    # ✅ 最后兜底：即使啥都没有，也别报错，直接指向 backend_dir/public/story.json
-    # 后面代码在写文件前会用 STORY_JSON_PATH.exists() 做检查，不会因为不存在就崩溃
-    return backend_dir / "public" / "story.json"
-
-
-
-_default_story_json_path = _discover_default_story_path()
-STORY_JSON_PATH = Path(os.getenv("STORY_JSON_PATH", _default_story_json_path))
-PUBLIC_DIR = STORY_JSON_PATH.parent
-
-
-def build_story_payload(story: models.Story) -> dict:
-    """Assemble a story payload compatible with story.json."""
-    payload = {
-        "id": story.id,
-        "version": story.version or "1.0",
-        "title": story.title or "Story",
-        "standfirst": story.standfirst or "",
-        "theme": {
-            "font": story.theme_font or "Montserrat",
-            "primaryColor": story.theme_primary_color or "#00007a",
-        },
-        "sections": [],
-    }
+import models, schemas, crud, events, patches, static_export, media_gc, media_probe, uploads, ndjson_export, preload
+from payloads import MEDIA_URL_MAX_LENGTH, build_story_payload
+from paths import get_public_dir, get_story_json_path, get_upload_tmp_dir
+from database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# 建表不再在 import 时执行，部署时先运行 `python migrate.py`
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时不阻塞：数据库连接在后台预热，失败只记日志，第一次请求时会再连
+    warmup = asyncio.create_task(run_in_threadpool(warm_up_database))
+    yield
+    warmup.cancel()
+
+def warm_up_database() -> None:
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+    except Exception as exc:
+        logger.warning("Database warm-up failed (will retry on first request): %s", exc)
 
-    for section in story.sections:
-        raw_data = section.data or "{}"
-        try:
-            parsed = json.loads(raw_data)
-        except json.JSONDecodeError:
-            parsed = {"type": section.type}
-        payload["sections"].append(parsed)
+app = FastAPI(title="Posts Backend", version="1.0.0", lifespan=lifespan)
 
+def build_story_meta(story: models.Story) -> dict:
+    """Story metadata without sections, used by the change feed."""
+    payload = build_story_payload(story)
+    payload.pop("sections")
+    payload["row_version"] = story.row_version
     return payload
 
 
@@ -88,15 +52,16 @@ def sync_story_json(db: Session, story_id: int) -> None:
 
     payload = build_story_payload(story)
 
-    if not STORY_JSON_PATH.exists():
+    story_json_path = get_story_json_path()
+    if not story_json_path.exists():
         logging.getLogger(__name__).warning(
             "story.json not found at %s; skipping sync to avoid creating new files",
-            STORY_JSON_PATH,
+            story_json_path,
         )
         return
 
     try:
-        STORY_JSON_PATH.write_text(
+        story_json_path.write_text(
             json.dumps(payload, ensure_ascii=False, indent=2),
             encoding="utf-8",
         )
@@ -110,7 +75,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Link"],
 )
+# 103 Early Hints（仅在服务器支持 ASGI early hint 扩展时生效）
+app.add_middleware(preload.EarlyHintsMiddleware)
 
 def get_db():
     db = SessionLocal()
@@ -119,98 +87,334 @@ def get_db():
     finally:
         db.close()
 
+def set_preload_links(response: Response, db: Session, story_id: int, manifest: Optional[list] = None) -> None:
+    """Advertise the story's critical assets as absolute `Link: rel=preload` URLs (for CDNs / edge hints)."""
+    if manifest is None:
+        manifest = preload.get_manifest(db, story_id)
+    header = preload.link_header(manifest or [])
+    if header:
+        response.headers["Link"] = header
+
+def etag(row_version: int) -> str:
+    return f'"{row_version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Turn an If-Match header into the expected row_version (None = unconditional)."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        # 不是我们签发的 ETag，永远不可能匹配
+        raise HTTPException(status_code=412, detail="If-Match does not match any known version")
+
+def story_etag(payload: dict) -> str:
+    """Strong ETag over the whole story payload, so section and media metadata edits change it too."""
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f'"story-{hashlib.sha256(body).hexdigest()[:16]}"'
+
+def story_response(story: models.Story, response: Response, if_none_match: Optional[str] = None):
+    """Story payload plus its row_version (for If-Match), with ETag; 304 when If-None-Match matches."""
+    payload = build_story_payload(story)
+    payload["row_version"] = story.row_version
+    tag = story_etag(payload)
+    if if_none_match and tag in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers={"ETag": tag})
+    response.headers["ETag"] = tag
+    return payload
+
+def story_if_match(db: Session, story_id: int, if_match: Optional[str]) -> Optional[int]:
+    """If-Match for PATCH /story: the ETag from GET (payload hash) or a bare row_version."""
+    tag = (if_match or "").strip().removeprefix("W/")
+    if not tag.startswith('"story-'):
+        return parse_if_match(if_match)
+    story = crud.get_story(db, story_id)
+    if not story:
+        return None
+    current = build_story_payload(story)
+    current["row_version"] = story.row_version
+    if story_etag(current) != tag:
+        raise HTTPException(status_code=412, detail="Resource was modified by someone else")
+    return story.row_version
+
+@app.exception_handler(crud.VersionConflict)
+def version_conflict_handler(request: Request, exc: crud.VersionConflict):
+    return JSONResponse(
+        status_code=412,
+        content={"detail": "Resource was modified by someone else", "row_version": exc.current_version},
+        headers={"ETag": etag(exc.current_version)},
+    )
+
 @app.get("/healthz")
 def health():
     return {"ok": True}
 
 @app.post("/posts", response_model=schemas.PostRead)
-def create_post(post: schemas.PostCreate, db: Session = Depends(get_db)):
+def create_post(post: schemas.PostCreate, response: Response, db: Session = Depends(get_db)):
     created = crud.create_post(db, post)
+    response.headers["ETag"] = etag(created.row_version)
     return created
 
+# 列表接口的视图：summary 只返回轻量字段，full 返回完整对象
+LIST_VIEW_PATTERN = "^(summary|full)$"
+
 @app.get("/posts", response_model=List[schemas.PostRead])
-def list_posts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_posts(db, skip=skip, limit=limit)
+def list_posts(
+    skip: int = 0,
+    limit: int = 100,
+    view: str = Query("full", pattern=LIST_VIEW_PATTERN),
+    db: Session = Depends(get_db),
+):
+    # 直接用 Core 查询拼 JSON（最多两条 SQL），输出与 PostRead / PostSummary 一致
+    return JSONResponse(crud.list_posts_json(db, skip=skip, limit=limit, view=view))
 
 @app.get("/posts/{post_id}", response_model=schemas.PostRead)
-def read_post(post_id: int, db: Session = Depends(get_db)):
+def read_post(post_id: int, response: Response, db: Session = Depends(get_db)):
     post = crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    response.headers["ETag"] = etag(post.row_version)
     return post
 
 @app.put("/posts/{post_id}", response_model=schemas.PostRead)
 @app.patch("/posts/{post_id}", response_model=schemas.PostRead)
-def update_post(post_id: int, payload: schemas.PostUpdate, db: Session = Depends(get_db)):
-    post = crud.update_post(db, post_id, payload)
+def update_post(
+    post_id: int,
+    payload: schemas.PostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    post = crud.update_post(db, post_id, payload, expected_version=parse_if_match(if_match))
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    response.headers["ETag"] = etag(post.row_version)
     return post
 
 @app.delete("/posts/{post_id}")
-def delete_post(post_id: int, db: Session = Depends(get_db)):
-    ok = crud.delete_post(db, post_id)
+def delete_post(post_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    ok = crud.delete_post(db, post_id, expected_version=parse_if_match(if_match))
     if not ok:
         raise HTTPException(status_code=404, detail="Post not found")
     return {"deleted": True, "id": post_id}
 
 # Sections CRUD API
 @app.get("/sections", response_model=List[schemas.SectionRead])
-def list_sections(story_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_sections(db, story_id=story_id, skip=skip, limit=limit)
+def list_sections(
+    story_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    view: str = Query("full", pattern=LIST_VIEW_PATTERN),
+    db: Session = Depends(get_db),
+):
+    return JSONResponse(crud.list_sections_json(db, story_id=story_id, skip=skip, limit=limit, view=view))
+
+@app.get("/sections/search", response_model=List[schemas.SectionSummary])
+def search_sections(
+    media_url: Optional[str] = None,
+    layout: Optional[str] = None,
+    autoplay: Optional[bool] = None,
+    story_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """按 data 里的字段查找 section（走生成列 / 引用索引，不逐行解析 JSON）
+
+    - media_url: 任何位置引用了该媒体地址的 section
+    - layout: data.layout 等于该值的 section
+    - autoplay: data.autoplay 为 true / false 的 video section
+    """
+    return JSONResponse(crud.search_sections(db, media_url=media_url, layout=layout, autoplay=autoplay, story_id=story_id, limit=limit))
 
 @app.get("/sections/{section_id}", response_model=schemas.SectionRead)
-def read_section(section_id: int, db: Session = Depends(get_db)):
+def read_section(section_id: int, response: Response, db: Session = Depends(get_db)):
     section = crud.get_section(db, section_id)
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
+    response.headers["ETag"] = etag(section.row_version)
     return section
 
 @app.post("/sections", response_model=schemas.SectionRead)
-def create_section(section: schemas.SectionCreate, story_id: int, db: Session = Depends(get_db)):
+def create_section(section: schemas.SectionCreate, story_id: int, response: Response, db: Session = Depends(get_db)):
     created = crud.create_section(db, section, story_id)
+    response.headers["ETag"] = etag(created.row_version)
     sync_story_json(db, created.story_id)
+    events.publish(db, created.story_id, "section.created", {
+        **events.section_event_data(created, include_data=True),
+        "order": crud.get_section_order(db, created.story_id),
+    })
     return created
 
 @app.patch("/sections/{section_id}", response_model=schemas.SectionRead)
-def update_section_endpoint(section_id: int, section_update: dict, db: Session = Depends(get_db)):
-    section = crud.update_section(
-        db, section_id,
-        section_type=section_update.get("type"),
-        data=section_update.get("data"),
-        sort_order=section_update.get("sort_order")
-    )
+def update_section_endpoint(
+    section_id: int,
+    request: Request,
+    response: Response,
+    section_update: Union[dict, list] = Body(...),
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """更新 section。
+
+    - application/json：{"type", "data", "sort_order"}，data 为完整 JSON 字符串
+    - application/merge-patch+json：请求体是对 data 的 RFC 7396 merge patch
+    - application/json-patch+json：请求体是对 data 的 RFC 6902 操作数组
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    expected_version = parse_if_match(if_match)
+    if content_type in (patches.MERGE_PATCH_CONTENT_TYPE, patches.JSON_PATCH_CONTENT_TYPE):
+        apply = patches.merge_patch if content_type == patches.MERGE_PATCH_CONTENT_TYPE else patches.json_patch
+        try:
+            section = crud.patch_section_data(
+                db, section_id,
+                lambda current: apply(current, section_update),
+                expected_version=expected_version,
+            )
+        except patches.PatchTestFailed as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        data_changed = True
+        moved = False
+    else:
+        if not isinstance(section_update, dict):
+            raise HTTPException(status_code=422, detail="Expected a JSON object")
+        if section_update.get("data") is not None:
+            try:
+                json.loads(section_update["data"])
+            except (TypeError, json.JSONDecodeError) as exc:
+                raise HTTPException(status_code=422, detail=f"data must be a JSON string: {exc}")
+        section = crud.update_section(
+            db, section_id,
+            section_type=section_update.get("type"),
+            data=section_update.get("data"),
+            sort_order=section_update.get("sort_order"),
+            expected_version=expected_version,
+        )
+        data_changed = section_update.get("type") is not None or section_update.get("data") is not None
+        moved = section_update.get("sort_order") is not None
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
+    response.headers["ETag"] = etag(section.row_version)
     sync_story_json(db, section.story_id)
+    if data_changed:
+        events.publish(db, section.story_id, "section.updated", events.section_event_data(section, include_data=True))
+    if moved:
+        events.publish(db, section.story_id, "section.moved", {
+            **events.section_event_data(section),
+            "order": crud.get_section_order(db, section.story_id),
+        })
     return section
 
 @app.delete("/sections/{section_id}")
-def delete_section_endpoint(section_id: int, db: Session = Depends(get_db)):
-    story_id = crud.delete_section(db, section_id)
+def delete_section_endpoint(section_id: int, if_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    story_id = crud.delete_section(db, section_id, expected_version=parse_if_match(if_match))
     if story_id is None:
         raise HTTPException(status_code=404, detail="Section not found")
     sync_story_json(db, story_id)
+    events.publish(db, story_id, "section.deleted", {
+        "id": section_id,
+        "order": crud.get_section_order(db, story_id),
+    })
     return {"deleted": True, "id": section_id}
 
 # Get full story data (compatible with story.json format)
 @app.get("/story")
-def get_story(db: Session = Depends(get_db)):
-    """获取完整的 story 数据（兼容 story.json 格式）"""
+def get_story(response: Response, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """获取完整的 story 数据（兼容 story.json 格式）
+
+    ETag 是整个返回内容的哈希（section、媒体元数据变化都会改变它），支持 If-None-Match → 304；
+    story 元数据的 row_version 单独放在返回的 row_version 字段里，PATCH /story/{id} 的
+    If-Match 可以用它，也可以直接用这里的 ETag。各 section 的版本见 /sections 返回的 row_version。
+    """
     # 获取最新的 story
     story = crud.get_latest_story(db)
     if not story:
         raise HTTPException(status_code=404, detail="No story found")
 
-    return build_story_payload(story)
+    set_preload_links(response, db, story.id)
+    return story_response(story, response, if_none_match)
+
+@app.get("/stories/{story_id}")
+def read_story(story_id: int, response: Response, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """获取指定 story（格式、ETag 同 /story）"""
+    story = crud.get_story(db, story_id)
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+
+    set_preload_links(response, db, story.id)
+    return story_response(story, response, if_none_match)
+
+@app.get("/stories/{story_id}/preload")
+def story_preload(story_id: int, response: Response, db: Session = Depends(get_db)):
+    """首屏关键资源清单（hero / 首个 video poster、前几张图片、主题字体），供页面 / SSR / 边缘节点注入 <link rel=preload>
+
+    href 保持 story 里的原样（站内路径相对于前端站点）；浏览器只在页面导航响应上处理
+    Link preload 和 103，所以真正改善 LCP 的是页面使用这份清单。
+    """
+    manifest = preload.get_manifest(db, story_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    set_preload_links(response, db, story_id, manifest)
+    return {"story_id": story_id, "assets": manifest}
 
 @app.patch("/story/{story_id}")
-def update_story(story_id: int, payload: schemas.StoryUpdate, db: Session = Depends(get_db)):
-    updated = crud.update_story(db, story_id, payload)
+def update_story(
+    story_id: int,
+    payload: schemas.StoryUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    updated = crud.update_story(db, story_id, payload, expected_version=story_if_match(db, story_id, if_match))
     if not updated:
         raise HTTPException(status_code=404, detail="Story not found")
     sync_story_json(db, story_id)
-    return build_story_payload(updated)
+    events.publish(db, story_id, "story.updated", build_story_meta(updated))
+    return story_response(updated, response)
+
+# Per-story change feed (Server-Sent Events)
+@app.get("/stories/{story_id}/events")
+async def story_events(story_id: int, last_event_id: Optional[int] = Header(None)):
+    """推送 story 的增量变更事件；断线重连时浏览器会带上 Last-Event-ID 继续。"""
+    return StreamingResponse(
+        events.stream(story_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Static export: hashed + precompressed story bundles for CDN / static hosting
+@app.post("/export/static")
+def export_static(story_id: Optional[int] = None, force: bool = False, db: Session = Depends(get_db)):
+    """导出静态 story 文件（增量：内容未变的 story 会跳过）"""
+    return static_export.export_stories(
+        db,
+        get_public_dir(),
+        story_ids=[story_id] if story_id is not None else None,
+        force=force,
+    )
+
+# Full NDJSON dump of stories (with sections) and posts (with media)
+@app.get("/export.ndjson")
+def export_ndjson(after: Optional[str] = None, chunk_size: int = Query(ndjson_export.CHUNK_SIZE, ge=1, le=5000)):
+    """逐行流式导出；中断后用最后一行的 kind:id 作为 after 继续"""
+    try:
+        ndjson_export.parse_after(after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    def lines():
+        # 流式响应期间请求依赖已经结束，这里使用独立的 session
+        db = SessionLocal()
+        try:
+            yield from ndjson_export.iter_export(db, after=after, chunk_size=chunk_size)
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 # Optional: Import story.json from the frontend and convert sections into posts
 @app.post("/import/story", response_model=List[schemas.PostRead])
@@ -405,47 +609,111 @@ def import_story_merged(frontend_root: Optional[str] = None, db: Session = Depen
     ))
     return created
 
-# 文件上传 API
-@app.post("/upload")
-async def upload_file(
-    file: UploadFile = File(...),
-    target_path: str = Form(...)
+# Media reference index & orphan upload GC
+@app.get("/media/references")
+def media_references(url: str, db: Session = Depends(get_db)):
+    """查询某个媒体地址被哪些 section / post 引用"""
+    refs = crud.get_media_references(db, url)
+    return [{"owner_type": r.owner_type, "owner_id": r.owner_id, "url": r.url} for r in refs]
+
+@app.post("/media/gc")
+def media_garbage_collect(
+    dry_run: bool = True,
+    grace_hours: float = Query(media_gc.GRACE_HOURS, ge=media_gc.MIN_GRACE_HOURS),
+    batch_size: int = Query(media_gc.BATCH_SIZE, ge=1, le=1000),
+    db: Session = Depends(get_db),
 ):
+    """回收一批未被引用的上传文件；remaining 为 true 时可以再次调用"""
+    return media_gc.collect_garbage(db, get_public_dir(), grace_hours=grace_hours, batch_size=batch_size, dry_run=dry_run)
+
+# 文件上传 API
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["file", "target_path"],
+                "properties": {
+                    "file": {"type": "string", "format": "binary"},
+                    "target_path": {"type": "string"},
+                },
+            }
+        }
+    },
+}
+
+@app.exception_handler(uploads.UploadRejected)
+def upload_rejected_handler(request: Request, exc: uploads.UploadRejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+
+def resolve_upload_target(target_path: str) -> PurePosixPath:
+    """Validate target_path and return it relative to the public directory."""
+    # Ensure requested path stays under the public directory
+    pure_target = PurePosixPath(target_path.lstrip('/'))
+    if any(part == '..' for part in pure_target.parts):
+        raise HTTPException(status_code=400, detail="非法目标路径")
+
+    if not pure_target.parts:
+        raise HTTPException(status_code=400, detail="目标路径不能为空")
+    if len("/" + pure_target.as_posix()) > MEDIA_URL_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"目标路径过长（最多 {MEDIA_URL_MAX_LENGTH} 个字符）")
+
+    full_path = (get_public_dir() / Path(*pure_target.parts)).resolve()
+    public_root_resolved = get_public_dir().resolve()
+    if public_root_resolved not in full_path.parents and full_path != public_root_resolved:
+        raise HTTPException(status_code=400, detail="目标路径不在允许的 public 目录内")
+    return pure_target
+
+def move_upload(received: uploads.StreamedUpload, full_path: Path) -> None:
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(received.tmp_path, full_path)
+    received.tmp_path = None
+
+def record_uploaded_file(db: Session, url: str, full_path: Path) -> dict:
+    """记录上传文件（未被引用的会由 media_gc 在宽限期后回收）并保存媒体元数据"""
+    metadata = media_probe.probe_file(full_path)
+    crud.record_upload(db, url, metadata["size"])
+    crud.upsert_media_metadata(db, url, metadata)
+    return metadata
+
+@app.post("/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload_file(request: Request, db: Session = Depends(get_db)):
     """上传文件到前端 public 目录的指定路径
     
-    前端传递：
+    前端传递（multipart/form-data）：
     - file: 上传的文件
     - target_path: 保存路径，例如：/media/demo/video.mp4
-    """
-    try:
-        PUBLIC_DIR.mkdir(parents=True, exist_ok=True)
-
-        # Ensure requested path stays under the public directory
-        pure_target = PurePosixPath(target_path.lstrip('/'))
-        if any(part == '..' for part in pure_target.parts):
-            raise HTTPException(status_code=400, detail="非法目标路径")
-
-        if not pure_target.parts:
-            raise HTTPException(status_code=400, detail="目标路径不能为空")
 
-        relative_path = Path(*pure_target.parts)
-        full_path = (PUBLIC_DIR / relative_path).resolve()
-        public_root_resolved = PUBLIC_DIR.resolve()
-        if public_root_resolved not in full_path.parents and full_path != public_root_resolved:
-            raise HTTPException(status_code=400, detail="目标路径不在允许的 public 目录内")
-
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(full_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        return {
-            "success": True,
-            "url": target_path,  # 返回前端使用的路径
-            "filename": full_path.name
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+    请求体边接收边写入 public 旁边的临时目录（paths.get_upload_tmp_dir），再原子改名到目标路径；
+    超过 UPLOAD_MAX_BYTES 返回 413，本机所有 worker 合计的并发上传超过 UPLOAD_MAX_CONCURRENCY 返回 503 + Retry-After。
+    """
+    tmp_dir = get_upload_tmp_dir()
+    with uploads.upload_slots.claim(tmp_dir / uploads.SLOTS_DIR_NAME):
+        received = await uploads.receive_multipart(request, tmp_dir)
+        try:
+            target_path = received.fields.get("target_path")
+            if not target_path:
+                raise HTTPException(status_code=400, detail="缺少 target_path")
+            pure_target = resolve_upload_target(target_path)
+            full_path = get_public_dir() / Path(*pure_target.parts)
+            await run_in_threadpool(move_upload, received, full_path)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+        finally:
+            received.discard()
+
+    # 探测文件、写数据库都是阻塞操作，放到线程池里，避免卡住其他请求
+    metadata = await run_in_threadpool(record_uploaded_file, db, "/" + pure_target.as_posix(), full_path)
+
+    return {
+        "success": True,
+        "url": target_path,  # 返回前端使用的路径
+        "filename": full_path.name,
+        "metadata": metadata,
+    }
 
 if __name__ == "__main__":
     import uvicorn
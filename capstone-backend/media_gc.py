@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""孤儿上传文件回收：删除超过宽限期、且没有任何 section / post 引用的上传文件。
+
+每次调用只处理一批（batch_size），可以反复执行直到 remaining 为 False。
+宽限期用来覆盖“已上传、编辑器还没保存 section”的窗口。
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+import crud, models
+from payloads import UPLOADS_URL_PREFIX, media_file_path
+
+GRACE_HOURS = float(os.getenv("MEDIA_GC_GRACE_HOURS", "24"))
+# HTTP 接口允许的最小宽限期，防止调用方用 0 / 负数删掉编辑器刚上传、还没保存进 section 的文件
+MIN_GRACE_HOURS = float(os.getenv("MEDIA_GC_MIN_GRACE_HOURS", "1"))
+BATCH_SIZE = 100
+UPLOADS_SUBDIR = Path("media") / "uploads"
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_media_references(db: Session) -> int:
+    """Rebuild the whole reference index from sections and Media rows."""
+    db.query(models.MediaReference).delete(synchronize_session=False)
+    count = 0
+    for section in db.query(models.Section.id, models.Section.data).yield_per(500):
+        urls = crud.section_media_urls(section.data)
+        crud.set_media_references(db, "section", section.id, urls)
+        count += len(urls)
+    media_by_post = {}
+    for media in db.query(models.Media.post_id, models.Media.url).yield_per(500):
+        media_by_post.setdefault(media.post_id, []).append(media.url)
+    for post_id, urls in media_by_post.items():
+        crud.set_media_references(db, "post", post_id, urls)
+        count += len(urls)
+    db.commit()
+    return count
+
+
+def rebuild_media_references_if_empty(db: Session) -> Optional[int]:
+    """Build the reference index for a database that predates it; None if it already has rows."""
+    if db.query(models.MediaReference.id).first() is not None:
+        return None
+    return rebuild_media_references(db)
+
+
+def backfill_uploads(db: Session, public_dir: Path) -> int:
+    """Record files already in <public>/media/uploads that predate the uploads table.
+
+    Their created_at comes from the file mtime, so they are usually past the grace
+    period at once: the reference index must be complete before the next GC run.
+    """
+    uploads_dir = public_dir / UPLOADS_SUBDIR
+    if not uploads_dir.is_dir():
+        return 0
+    known = {row.url for row in db.query(models.Upload.url)}
+    added = 0
+    for path in uploads_dir.rglob("*"):
+        if not path.is_file():
+            continue
+        url = "/" + path.relative_to(public_dir).as_posix()
+        if url in known:
+            continue
+        stat = path.stat()
+        db.add(models.Upload(url=url, size=stat.st_size, created_at=datetime.utcfromtimestamp(stat.st_mtime)))
+        added += 1
+    db.commit()
+    return added
+
+
+def collect_garbage(
+    db: Session,
+    public_dir: Path,
+    grace_hours: float = GRACE_HOURS,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+) -> dict:
+    """Delete one batch of unreferenced uploads under media/uploads older than the grace period."""
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    referenced = exists().where(models.MediaReference.url == models.Upload.url)
+    candidates = (
+        db.query(models.Upload)
+        .filter(
+            models.Upload.url.startswith(UPLOADS_URL_PREFIX, autoescape=True),
+            models.Upload.created_at < cutoff,
+            ~referenced,
+        )
+        .order_by(models.Upload.id.asc())
+        .limit(batch_size + 1)
+        .all()
+    )
+    remaining = len(candidates) > batch_size
+    candidates = candidates[:batch_size]
+
+    report = {"deleted": [], "reclaimed_bytes": 0, "remaining": remaining, "dry_run": dry_run}
+    for upload in candidates:
+        path = media_file_path(public_dir, upload.url)
+        size = upload.size or 0
+        if path is not None and path.is_file():
+            size = path.stat().st_size
+            if not dry_run:
+                try:
+                    path.unlink()
+                except OSError as exc:
+                    logger.warning("Failed to delete %s: %s", path, exc)
+                    continue
+        if not dry_run:
+            db.delete(upload)
+        report["deleted"].append(upload.url)
+        report["reclaimed_bytes"] += size
+    if not dry_run:
+        db.commit()
+    logger.info("Media GC: %d files, %d bytes reclaimed", len(report["deleted"]), report["reclaimed_bytes"])
+    return report
+
+
+def collect_all_garbage(db: Session, public_dir: Path, max_batches: Optional[int] = None, **kwargs) -> dict:
+    """Run collect_garbage batch after batch until nothing is left (or max_batches)."""
+    total = {"deleted": [], "reclaimed_bytes": 0, "batches": 0, "remaining": False}
+    while max_batches is None or total["batches"] < max_batches:
+        report = collect_garbage(db, public_dir, **kwargs)
+        total["batches"] += 1
+        total["deleted"].extend(report["deleted"])
+        total["reclaimed_bytes"] += report["reclaimed_bytes"]
+        total["remaining"] = report["remaining"]
+        if not report["remaining"] or report["dry_run"]:
+            break
+    return total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced uploads")
+    parser.add_argument("--rebuild-refs", action="store_true", help="rebuild the media reference index first")
+    parser.add_argument("--backfill", action="store_true", help="record existing files in media/uploads first (implies --rebuild-refs)")
+    parser.add_argument("--grace-hours", type=float, default=GRACE_HOURS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    from paths import get_public_dir
+
+    db = SessionLocal()
+    try:
+        # 回填的旧文件立刻超过宽限期，引用索引不完整就会删掉仍在使用的文件，所以 --backfill 总是先重建索引
+        if args.rebuild_refs or args.backfill:
+            print(f"Indexed {rebuild_media_references(db)} media references")
+        if args.backfill:
+            print(f"Recorded {backfill_uploads(db, get_public_dir())} existing uploads")
+        result = collect_all_garbage(
+            db, get_public_dir(),
+            max_batches=args.max_batches,
+            grace_hours=args.grace_hours,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    finally:
+        db.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""只读容器头部获取媒体元数据（不解码像素）：JPEG / PNG / GIF / WebP / MP4。
+
+probe() 返回 {"format", "width", "height", "duration", "size"}，无法识别时只有 size。
+"""
+import struct
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+# 这些后缀的文件会被 backfill 扫描
+PROBE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".m4v", ".mov"}
+
+# JPEG 中携带尺寸的 SOF 标记（排除 DHT / JPG / DAC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# MP4 中需要向下查找的容器 box
+_MP4_CONTAINERS = {b"moov", b"trak"}
+# EXIF Orientation 5-8 表示图像需要转 90° 显示，宽高互换
+_EXIF_ORIENTATION_TAG = 0x0112
+_EXIF_TRANSPOSED = {5, 6, 7, 8}
+
+
+def _probe_png(fh: BinaryIO, head: bytes) -> Optional[dict]:
+    if head[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", head[16:24])
+    return {"format": "png", "width": width, "height": height}
+
+
+def _probe_gif(fh: BinaryIO, head: bytes) -> Optional[dict]:
+    width, height = struct.unpack("<HH", head[6:10])
+    return {"format": "gif", "width": width, "height": height}
+
+
+def _probe_webp(fh: BinaryIO, head: bytes) -> Optional[dict]:
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+    elif chunk == b"VP8L":
+        bits = int.from_bytes(head[21:25], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        width &= 0x3FFF
+        height &= 0x3FFF
+    else:
+        return None
+    return {"format": "webp", "width": width, "height": height}
+
+
+def _exif_orientation(segment: bytes) -> Optional[int]:
+    """Orientation (tag 0x0112) from an APP1 segment body, None when absent."""
+    if segment[:6] != b"Exif\x00\x00":
+        return None
+    tiff = segment[6:]
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return None
+    ifd_offset = struct.unpack(order + "I", tiff[4:8])[0]
+    count = struct.unpack(order + "H", tiff[ifd_offset:ifd_offset + 2])[0]
+    for i in range(count):
+        entry = ifd_offset + 2 + i * 12
+        tag, field_type = struct.unpack(order + "HH", tiff[entry:entry + 4])
+        if tag == _EXIF_ORIENTATION_TAG and field_type == 3:  # SHORT，值放在 value 字段前两个字节
+            return struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+    return None
+
+
+def _probe_jpeg(fh: BinaryIO, head: bytes) -> Optional[dict]:
+    orientation = None
+    fh.seek(2)
+    while True:
+        byte = fh.read(1)
+        if not byte:
+            return None
+        if byte != b"\xFF":
+            continue
+        marker = fh.read(1)
+        while marker == b"\xFF":  # 填充字节
+            marker = fh.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue  # 无长度字段的标记
+        if code == 0xD9:
+            return None
+        length_bytes = fh.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if code == 0xE1 and orientation is None:
+            # APP1 / Exif 总在 SOF 之前；手机照片的像素是横的，靠 Orientation 旋转显示
+            try:
+                orientation = _exif_orientation(fh.read(length - 2))
+            except struct.error:
+                pass  # EXIF 损坏时按原始方向返回
+            continue
+        if code in _JPEG_SOF_MARKERS:
+            sof = fh.read(5)
+            if len(sof) < 5:
+                return None
+            height, width = struct.unpack(">HH", sof[1:5])
+            if orientation in _EXIF_TRANSPOSED:
+                width, height = height, width
+            return {"format": "jpeg", "width": width, "height": height}
+        fh.seek(length - 2, 1)
+
+
+def _iter_boxes(fh: BinaryIO, start: int, end: Optional[int]):
+    offset = start
+    while end is None or offset + 8 <= end:
+        fh.seek(offset)
+        header = fh.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_len = 8
+        if size == 1:
+            size = struct.unpack(">Q", fh.read(8))[0]
+            header_len = 16
+        elif size == 0:
+            fh.seek(0, 2)
+            size = fh.tell() - offset
+        if size < header_len:
+            return
+        yield box_type, offset + header_len, offset + size
+        offset += size
+
+
+def _probe_mp4(fh: BinaryIO, head: bytes) -> Optional[dict]:
+    info = {"format": "mp4"}
+
+    def walk(start: int, end: Optional[int]) -> None:
+        for box_type, body, box_end in _iter_boxes(fh, start, end):
+            if box_type in _MP4_CONTAINERS:
+                walk(body, box_end)
+            elif box_type == b"mvhd":
+                fh.seek(body)
+                version = fh.read(1)[0]
+                fh.seek(body + 4)
+                if version == 1:
+                    _, _, timescale, duration = struct.unpack(">QQIQ", fh.read(28))
+                else:
+                    _, _, timescale, duration = struct.unpack(">IIII", fh.read(16))
+                if timescale:
+                    info["duration"] = round(duration / timescale, 3)
+            elif box_type == b"tkhd" and "width" not in info:
+                # tkhd 末尾是 3x3 变换矩阵（36 字节）和 width / height 两个 16.16 定点数
+                fh.seek(box_end - 44)
+                matrix = struct.unpack(">9i", fh.read(36))
+                width, height = struct.unpack(">II", fh.read(8))
+                if width and height:
+                    width, height = width >> 16, height >> 16
+                    # 手机竖拍的视频：a = d = 0 表示旋转 90° / 270°，显示尺寸宽高互换
+                    if matrix[0] == 0 and matrix[4] == 0:
+                        width, height = height, width
+                    info["width"] = width
+                    info["height"] = height
+
+    walk(0, None)
+    return info if len(info) > 1 else None
+
+
+def probe_file(path: Path) -> dict:
+    """Read just enough of the container header to get dimensions / duration."""
+    result = {"size": path.stat().st_size}
+    with open(path, "rb") as fh:
+        head = fh.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            parser = _probe_png
+        elif head[:6] in (b"GIF87a", b"GIF89a"):
+            parser = _probe_gif
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            parser = _probe_webp
+        elif head[:3] == b"\xFF\xD8\xFF":
+            parser = _probe_jpeg
+        elif head[4:8] == b"ftyp":
+            parser = _probe_mp4
+        else:
+            return result
+        try:
+            info = parser(fh, head)
+        except (struct.error, IndexError, OSError):
+            info = None
+    if info:
+        result.update(info)
+    return result
+
+
+def backfill(db, public_dir: Path, force: bool = False) -> int:
+    """Probe every media file under <public>/media and store its metadata."""
+    import crud
+
+    media_dir = public_dir / "media"
+    if not media_dir.is_dir():
+        return 0
+    known = set() if force else crud.get_media_metadata_urls(db)
+    count = 0
+    for path in sorted(media_dir.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in PROBE_SUFFIXES:
+            continue
+        url = "/" + path.relative_to(public_dir).as_posix()
+        if url in known:
+            continue
+        crud.upsert_media_metadata(db, url, probe_file(path), commit=False)
+        count += 1
+    db.commit()
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Probe media files under public/media and store their metadata")
+    parser.add_argument("--force", action="store_true", help="re-probe files that already have metadata")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    from paths import get_public_dir
+
+    db = SessionLocal()
+    try:
+        print(f"Probed {backfill(db, get_public_dir(), force=args.force)} media files")
+    finally:
+        db.close()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+迁移脚本：创建缺失的表并补齐新增字段（部署时在启动 uvicorn 之前运行）
+
+应用 import 时不再执行 create_all，这样 worker 冷启动不需要连接数据库。
+"""
+import sys
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import engine, Base, SessionLocal
+import models  # noqa: F401  注册所有表
+import migrate_add_row_versions
+import migrate_section_json
+import media_gc
+
+def migrate():
+    """创建所有缺失的表，再运行增量字段迁移"""
+    Base.metadata.create_all(bind=engine)
+    print("[+] Created missing tables")
+    migrate_add_row_versions.migrate()
+    migrate_section_json.migrate()
+    migrate_media_references()
+
+def migrate_media_references():
+    """media_references 是新表：为已有的 section / post 建立引用索引，否则 media_gc 会把在用的上传当成孤儿"""
+    db = SessionLocal()
+    try:
+        indexed = media_gc.rebuild_media_references_if_empty(db)
+    finally:
+        db.close()
+    if indexed is None:
+        print("- media_references already populated")
+    else:
+        print(f"[+] Indexed {indexed} media references")
+
+if __name__ == "__main__":
+    print("Starting database migration...\n")
+    migrate()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+迁移脚本：为 stories / sections / posts 表添加乐观锁 row_version 字段
+"""
+import sys
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import text
+from database import engine
+
+TABLES = ["stories", "sections", "posts"]
+
+def get_columns(connection, table):
+    if connection.dialect.name == 'sqlite':
+        result = connection.execute(text(f"PRAGMA table_info({table})"))
+        return [row[1] for row in result]
+    # MySQL
+    result = connection.execute(text("""
+        SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+    """), {"table": table})
+    return [row[0] for row in result]
+
+def migrate():
+    """添加 row_version 列，已有数据从 1 开始"""
+    connection = engine.connect()
+
+    try:
+        with connection.begin():
+            for table in TABLES:
+                existing_columns = get_columns(connection, table)
+                if 'row_version' in existing_columns:
+                    print(f"- '{table}.row_version' column already exists")
+                    continue
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1"))
+                print(f"[+] Added '{table}.row_version' column")
+
+        print("\n[OK] Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        # 让 `python migrate.py && uvicorn ...` 在迁移失败时停下，不要带着半迁移的表启动
+        raise
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...\n")
+    migrate()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+迁移脚本：sections.data 改为 JSON 列，并添加带索引的生成列 data_src / data_layout
+
+- MySQL：先修复非法 JSON，再把 data 改成原生 JSON 类型（已有行的文本随之规范化：键顺序、空白会变）
+- SQLite：data 仍是 TEXT（JSON1 函数直接查询），只修复非法 JSON
+生成列表达式取自 models.Section（按方言展开为 json_extract / JSON_UNQUOTE(JSON_EXTRACT)）；
+早期版本在 SQLite 上用 `->>` 建的生成列会被删掉重建，否则 3.38 之前的 SQLite 无法读取表结构。
+"""
+import sys
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import text
+from database import engine
+import models
+
+GENERATED_COLUMNS = ("data_src", "data_layout")
+
+def generated_column_ddl(connection, name):
+    """`<type> GENERATED ALWAYS AS (<expr>)` for a models.Section computed column, in this dialect."""
+    column = models.Section.__table__.c[name]
+    column_type = column.type.compile(dialect=connection.dialect)
+    expression = column.computed.sqltext.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    return f"{column_type} GENERATED ALWAYS AS ({expression})"
+
+def sqlite_uses_arrow_operator(connection):
+    table_sql = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'sections'"
+    )).scalar() or ""
+    return "->>" in table_sql
+
+def get_columns(connection):
+    if connection.dialect.name == 'sqlite':
+        # table_xinfo 才会列出生成列
+        result = connection.execute(text("PRAGMA table_xinfo(sections)"))
+        return {row[1]: row[2].upper() for row in result}
+    # MySQL
+    result = connection.execute(text("""
+        SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'sections'
+    """))
+    return {row[0]: row[1].upper() for row in result}
+
+def migrate():
+    """修复非法 JSON → 改列类型 → 添加生成列和索引"""
+    connection = engine.connect()
+    is_mysql = connection.dialect.name == 'mysql'
+
+    try:
+        with connection.begin():
+            columns = get_columns(connection)
+
+            # 非法 JSON 无法放进 JSON 列，也会让生成列报错；按 build_story_payload 的兜底写成 {"type": ...}
+            if is_mysql:
+                fixed = connection.execute(text(
+                    "UPDATE sections SET data = JSON_OBJECT('type', type) WHERE data IS NOT NULL AND NOT JSON_VALID(data)"
+                ))
+            else:
+                fixed = connection.execute(text(
+                    "UPDATE sections SET data = json_object('type', type) WHERE data IS NOT NULL AND NOT json_valid(data)"
+                ))
+            print(f"[+] Repaired {fixed.rowcount} rows with invalid JSON")
+
+            if is_mysql and columns.get('data') != 'JSON':
+                connection.execute(text("ALTER TABLE sections MODIFY data JSON NULL"))
+                print("[+] Changed 'sections.data' to JSON")
+            else:
+                print("- 'sections.data' type unchanged")
+
+            if not is_mysql and sqlite_uses_arrow_operator(connection):
+                for name in GENERATED_COLUMNS:
+                    if name in columns:
+                        connection.execute(text(f"DROP INDEX IF EXISTS ix_sections_{name}"))
+                        connection.execute(text(f"ALTER TABLE sections DROP COLUMN {name}"))
+                        columns.pop(name)
+                        print(f"[+] Dropped '{name}' (built with ->>) to recreate it")
+
+            for name in GENERATED_COLUMNS:
+                if name in columns:
+                    print(f"- '{name}' column already exists")
+                    continue
+                connection.execute(text(
+                    f"ALTER TABLE sections ADD COLUMN {name} {generated_column_ddl(connection, name)} VIRTUAL"
+                ))
+                connection.execute(text(f"CREATE INDEX ix_sections_{name} ON sections ({name})"))
+                print(f"[+] Added generated column '{name}' with index")
+
+        print("\n[OK] Migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n[ERROR] Migration failed: {e}")
+        # 让 `python migrate.py && uvicorn ...` 在迁移失败时停下，不要带着半迁移的表启动
+        raise
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...\n")
+    migrate()
@@ -9,6 +9,7 @@ CREATE TABLE IF NOT EXISTS `posts` (
   `author` VARCHAR(128) NULL,
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `row_version` INT NOT NULL DEFAULT 1,
   PRIMARY KEY (`id`),
   KEY `idx_posts_created_at` (`created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -1,8 +1,54 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Computed, Integer, BigInteger, Float, String, Text, DateTime, ForeignKey, Index, func, literal_column
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import TypeDecorator, UserDefinedType
 from datetime import datetime
 from database import Base
 
+class _NativeJSON(UserDefinedType):
+    """MySQL JSON column type; binds and returns JSON strings without json.loads/dumps on the Python side."""
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "JSON"
+
+class JSONText(TypeDecorator):
+    """JSON 文档列：MySQL 上是原生 JSON 类型，SQLite 上是 TEXT（用 JSON1 函数查询）。
+
+    Python 侧始终是 JSON 字符串，与 SectionBase.data 保持一致。MySQL 按二进制格式保存 JSON，
+    读回的是规范化后的文本（对象键重新排序、空白改写、重复键只保留最后一个），值本身不变；
+    SQLite 原样保存写入的文本。
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(_NativeJSON())
+        return dialect.type_descriptor(Text())
+
+class json_text(FunctionElement):
+    """JSON 文档中某个路径的文本值（字符串去掉引号）。
+
+    按方言展开，不用 `->>`（SQLite 3.38 之前不支持）：
+    SQLite 为 json_extract(doc, path)，MySQL 为 JSON_UNQUOTE(JSON_EXTRACT(doc, path))。
+    """
+    type = Text()
+    name = "json_text"
+    inherit_cache = True
+
+@compiles(json_text)
+def _compile_json_text(element, compiler, **kw):
+    return "json_extract(%s)" % compiler.process(element.clauses, **kw)
+
+@compiles(json_text, "mysql")
+def _compile_json_text_mysql(element, compiler, **kw):
+    return "JSON_UNQUOTE(JSON_EXTRACT(%s))" % compiler.process(element.clauses, **kw)
+
+def _data_field(path: str, length: int):
+    return func.substr(json_text(literal_column("data"), literal_column(f"'{path}'")), 1, length)
+
 class Story(Base):
     """Story 主表 - 存储 story.json 的元数据"""
     __tablename__ = "stories"
@@ -14,7 +60,9 @@ class Story(Base):
     theme_primary_color = Column(String(16), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
-    
+    # 乐观锁版本号：每次写入 +1，以 ETag 形式暴露，配合 If-Match 使用
+    row_version = Column(Integer, default=1, server_default="1", nullable=False)
+
     sections = relationship("Section", back_populates="story", cascade="all, delete-orphan", order_by="Section.sort_order")
 
 class Section(Base):
@@ -26,10 +74,25 @@ class Section(Base):
     sort_order = Column(Integer, default=0, nullable=False)
     
     # 存储 section 的完整 JSON 数据
-    data = Column(Text, nullable=True)  # JSON string containing all section properties
+    data = Column(JSONText, nullable=True)  # JSON string containing all section properties
+    # 从 data 中抽出的常用字段：数据库生成、带索引（需要 MySQL 5.7+ / 带 JSON1 的 SQLite 3.31+）
+    # images[*].src 等数组里的地址由 media_references 表索引
+    data_src = Column(String(512), Computed(_data_field("$.src", 512)), index=True)
+    data_layout = Column(String(32), Computed(_data_field("$.layout", 32)), index=True)
+    # 乐观锁版本号：每次写入 +1，以 ETag 形式暴露，配合 If-Match 使用
+    row_version = Column(Integer, default=1, server_default="1", nullable=False)
     
     story = relationship("Story", back_populates="sections")
 
+class StoryEvent(Base):
+    """Story 变更事件日志 - SSE 变更流按 id 增量读取，多个 worker 共享同一张表"""
+    __tablename__ = "story_events"
+    id = Column(Integer, primary_key=True, index=True)
+    story_id = Column(Integer, nullable=False, index=True)
+    kind = Column(String(32), nullable=False)  # section.created | section.updated | section.moved | section.deleted | story.updated
+    data = Column(Text, nullable=True)  # JSON string with the compact event payload
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 class Post(Base):
     __tablename__ = "posts"
     id = Column(Integer, primary_key=True, index=True)
@@ -39,6 +102,8 @@ class Post(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     author = Column(String(128), nullable=True)
+    # 乐观锁版本号：每次写入 +1，以 ETag 形式暴露，配合 If-Match 使用
+    row_version = Column(Integer, default=1, server_default="1", nullable=False)
 
     media = relationship("Media", back_populates="post", cascade="all, delete-orphan", order_by="Media.sort_order")
 
@@ -53,4 +118,34 @@ class Media(Base):
     credit = Column(String(255), nullable=True)
     sort_order = Column(Integer, default=0, nullable=False)
 
-    post = relationship("Post", back_populates="media")
\ No newline at end of file
+    post = relationship("Post", back_populates="media")
+
+class MediaReference(Base):
+    """媒体引用索引 - 每个 section / post 用到的媒体地址（src、poster、captions、images[].src 等）"""
+    __tablename__ = "media_references"
+    id = Column(Integer, primary_key=True, index=True)
+    owner_type = Column(String(16), nullable=False)  # section | post
+    owner_id = Column(Integer, nullable=False)
+    url = Column(String(512), nullable=False, index=True)
+
+    __table_args__ = (Index("ix_media_references_owner", "owner_type", "owner_id"),)
+
+class Upload(Base):
+    """/upload 写入的文件记录 - 没有被任何 MediaReference 引用且超过宽限期的会被回收"""
+    __tablename__ = "uploads"
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(512), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class MediaMetadata(Base):
+    """媒体元数据 - 上传时从容器头部解析的尺寸 / 时长 / 字节数，按 URL 存储"""
+    __tablename__ = "media_metadata"
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(512), nullable=False, unique=True)
+    format = Column(String(16), nullable=True)  # jpeg | png | gif | webp | mp4
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    duration = Column(Float, nullable=True)  # seconds, video only
+    size = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""NDJSON 全量导出 / 导入：每行一个 JSON 对象，先所有 story（含 sections），再所有 post（含 media）。
+
+每行都带 "kind" 和 "id"，中断后可以用最后一行的 "<kind>:<id>" 作为 after 继续导出。
+按主键分块读取（keyset），每块的子表用一条 IN 查询取回，内存占用与总数据量无关。
+
+用法：
+    python ndjson_export.py export [-o backup.ndjson] [--after story:12]
+    python ndjson_export.py import backup.ndjson [--batch-size 200] [--new-ids]
+"""
+import json
+from datetime import datetime
+from typing import IO, Iterator, Optional, Tuple
+
+from sqlalchemy import DateTime, insert, select
+from sqlalchemy.orm import Session
+
+import crud, models
+
+CHUNK_SIZE = 200
+KINDS = ("story", "post")
+
+# kind -> (父表, 子表, 子表外键, 子对象在行里的键名)
+_SPECS = {
+    "story": (models.Story.__table__, models.Section.__table__, "story_id", "sections"),
+    "post": (models.Post.__table__, models.Media.__table__, "post_id", "media"),
+}
+
+
+def parse_after(after: Optional[str]) -> Tuple[str, int]:
+    """Parse a resume cursor like "story:12" / "post:40" (None = from the beginning)."""
+    if not after:
+        return KINDS[0], 0
+    kind, _, raw_id = after.partition(":")
+    if kind not in KINDS or not raw_id.isdigit():
+        raise ValueError(f"Invalid cursor {after!r}, expected story:<id> or post:<id>")
+    return kind, int(raw_id)
+
+
+def _stored_columns(table) -> list:
+    """Columns that hold data; database-generated columns are rebuilt on import."""
+    return [column for column in table.columns if column.computed is None]
+
+
+def _to_json(row) -> dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def _iter_kind(db: Session, kind: str, after_id: int, chunk_size: int) -> Iterator[str]:
+    parent, child, foreign_key, child_key = _SPECS[kind]
+    cursor = after_id
+    while True:
+        rows = db.execute(
+            select(*_stored_columns(parent)).where(parent.c.id > cursor).order_by(parent.c.id).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            return
+        children = {row["id"]: [] for row in rows}
+        child_rows = db.execute(
+            select(*_stored_columns(child))
+            .where(child.c[foreign_key].in_(list(children)))
+            .order_by(child.c[foreign_key], child.c.sort_order, child.c.id)
+            .execution_options(stream_results=True, yield_per=chunk_size)
+        ).mappings()
+        for child_row in child_rows:
+            children[child_row[foreign_key]].append(_to_json(child_row))
+        for row in rows:
+            record = {"kind": kind, **_to_json(row), child_key: children[row["id"]]}
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        cursor = rows[-1]["id"]
+        # 每块结束后释放 identity map / 事务快照
+        db.rollback()
+
+
+def iter_export(db: Session, after: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield NDJSON lines for every story and post after the given cursor."""
+    start_kind, after_id = parse_after(after)
+    for kind in KINDS[KINDS.index(start_kind):]:
+        yield from _iter_kind(db, kind, after_id if kind == start_kind else 0, chunk_size)
+
+
+def _coerce(table, record: dict) -> dict:
+    """Keep only real columns and turn ISO strings back into datetimes."""
+    values = {}
+    for column in _stored_columns(table):
+        if column.name not in record:
+            continue
+        value = record[column.name]
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        values[column.name] = value
+    return values
+
+
+def _insert_parents(db: Session, table, records: list, new_ids: bool) -> list:
+    """Insert parent rows; return the id each record ended up with."""
+    if not new_ids:
+        db.execute(insert(table), [_coerce(table, record) for record in records])
+        return [record["id"] for record in records]
+    ids = []
+    for record in records:
+        values = _coerce(table, record)
+        values.pop("id", None)
+        ids.append(db.execute(insert(table).values(**values)).inserted_primary_key[0])
+    return ids
+
+
+def _flush_batch(db: Session, batch: list, new_ids: bool) -> None:
+    for kind in KINDS:
+        parent, child, foreign_key, child_key = _SPECS[kind]
+        records = [record for record in batch if record.get("kind") == kind]
+        if not records:
+            continue
+        parent_ids = _insert_parents(db, parent, records, new_ids)
+        child_values = []
+        for record, parent_id in zip(records, parent_ids):
+            for item in record.get(child_key, []):
+                values = _coerce(child, item)
+                if new_ids:
+                    values.pop("id", None)
+                values[foreign_key] = parent_id
+                child_values.append(values)
+
+        if kind == "story":
+            # 引用索引按 section 记录，需要每个 section 的 id
+            section_ids = _insert_parents(db, child, child_values, new_ids) if child_values else []
+            for section_id, values in zip(section_ids, child_values):
+                crud.set_media_references(db, "section", section_id, crud.section_media_urls(values.get("data")))
+        else:
+            if child_values:
+                db.execute(insert(child), child_values)
+            urls_by_post = {post_id: [] for post_id in parent_ids}
+            for values in child_values:
+                urls_by_post[values[foreign_key]].append(values.get("url"))
+            for post_id, urls in urls_by_post.items():
+                crud.set_media_references(db, "post", post_id, urls)
+    db.commit()
+
+
+def import_ndjson(db: Session, stream: IO[str], batch_size: int = CHUNK_SIZE, new_ids: bool = False) -> dict:
+    """Load an NDJSON export in batches; returns counts per kind."""
+    counts = {kind: 0 for kind in KINDS}
+    batch = []
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Line {line_number}: invalid JSON ({exc})")
+        if record.get("kind") not in KINDS:
+            raise ValueError(f"Line {line_number}: unknown kind {record.get('kind')!r}")
+        batch.append(record)
+        counts[record["kind"]] += 1
+        if len(batch) >= batch_size:
+            _flush_batch(db, batch, new_ids)
+            batch = []
+    if batch:
+        _flush_batch(db, batch, new_ids)
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Export / import all stories and posts as NDJSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export")
+    export_parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    export_parser.add_argument("--after", help="resume after story:<id> or post:<id>")
+    export_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    import_parser = sub.add_parser("import")
+    import_parser.add_argument("input", help="NDJSON file ('-' for stdin)")
+    import_parser.add_argument("--batch-size", type=int, default=CHUNK_SIZE)
+    import_parser.add_argument("--new-ids", action="store_true", help="let the database assign new ids")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.command == "export":
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                for line in iter_export(db, after=args.after, chunk_size=args.chunk_size):
+                    out.write(line)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        else:
+            src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                print(import_ndjson(db, src, batch_size=args.batch_size, new_ids=args.new_ids), file=sys.stderr)
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+    finally:
+        db.close()
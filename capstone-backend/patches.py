@@ -0,0 +1,144 @@
+"""Section data 的局部更新：RFC 7396 JSON Merge Patch 与 RFC 6902 JSON Patch。"""
+import copy
+from typing import Any, List
+
+MERGE_PATCH_CONTENT_TYPE = "application/merge-patch+json"
+JSON_PATCH_CONTENT_TYPE = "application/json-patch+json"
+
+
+class PatchError(ValueError):
+    """The patch document is malformed or cannot be applied."""
+
+
+class PatchTestFailed(PatchError):
+    """A JSON Patch "test" operation did not match."""
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply an RFC 7396 merge patch and return the merged document."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def _parse_pointer(pointer: Any) -> List[str]:
+    if not isinstance(pointer, str):
+        raise PatchError(f"JSON pointer must be a string: {pointer!r}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    limit = len(container) + (1 if allow_end else 0)
+    if index >= limit:
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _json_equal(left: Any, right: Any) -> bool:
+    """RFC 6902 4.6 equality: same JSON type, numbers compared by value (true != 1)."""
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool) and left == right
+    if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+        return left == right
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(_json_equal(left[key], right[key]) for key in left)
+    if isinstance(left, list) and isinstance(right, list):
+        return len(left) == len(right) and all(_json_equal(a, b) for a, b in zip(left, right))
+    return type(left) is type(right) and left == right
+
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    node = doc
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return node
+
+
+def _add(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, key, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(tokens)}")
+    return doc
+
+
+def _remove(doc: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise PatchError("Cannot remove the document root")
+    parent = _resolve(doc, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, key))
+    raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def json_patch(target: Any, operations: Any) -> Any:
+    """Apply an RFC 6902 JSON Patch; the operations are all-or-nothing."""
+    if not isinstance(operations, list):
+        raise PatchError("JSON Patch must be an array of operations")
+    doc = copy.deepcopy(target)
+    for op in operations:
+        if not isinstance(op, dict) or "op" not in op or "path" not in op:
+            raise PatchError(f"Invalid operation: {op!r}")
+        name = op["op"]
+        path = _parse_pointer(op["path"])
+        if name in ("add", "replace", "test") and "value" not in op:
+            raise PatchError(f"Operation {name!r} requires a value")
+        if name == "add":
+            doc = _add(doc, path, copy.deepcopy(op["value"]))
+        elif name == "remove":
+            _remove(doc, path)
+        elif name == "replace":
+            _resolve(doc, path)
+            if path:
+                _remove(doc, path)
+            doc = _add(doc, path, copy.deepcopy(op["value"]))
+        elif name in ("move", "copy"):
+            if "from" not in op:
+                raise PatchError(f"Operation {name!r} requires from")
+            source = _parse_pointer(op["from"])
+            if name == "move":
+                if path[:len(source)] == source and path != source:
+                    raise PatchError("Cannot move a value into one of its children")
+                value = _remove(doc, source) if source else doc
+            else:
+                value = copy.deepcopy(_resolve(doc, source))
+            doc = _add(doc, path, value)
+        elif name == "test":
+            if not _json_equal(_resolve(doc, path), op["value"]):
+                raise PatchTestFailed(f"Test failed at {op['path']}")
+        else:
+            raise PatchError(f"Unknown operation: {name!r}")
+    return doc
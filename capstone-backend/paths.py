@@ -0,0 +1,57 @@
+"""前端 public 目录与 story.json 的位置（首次使用时才探测文件系统）。"""
+import os
+from functools import lru_cache
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parent
+project_root = backend_dir.parent
+
+
+def _discover_default_story_path() -> Path:
+    """Locate a sensible default story.json when env var is not provided.
+
+    Preference order:
+      1. capstone-frontend/public/story.json inside the current project
+      2. capstone-frontend/public/story.json one directory above (GitHub Classroom root)
+      3. capstone-backend/public/story.json if it exists
+    """
+    candidate_public_dirs = [
+        project_root / "capstone-frontend" / "public",
+        project_root.parent / "capstone-frontend" / "public",
+        backend_dir / "public",
+    ]
+
+    # 如果这些目录里已经有 story.json，就直接用
+    for public_dir in candidate_public_dirs:
+        story_path = public_dir / "story.json"
+        if story_path.exists():
+            return story_path
+
+    # 如果目录存在但还没有 story.json，就先返回一个“将来会放在这里”的路径
+    for public_dir in candidate_public_dirs:
+        if public_dir.is_dir():
+            return public_dir / "story.json"
+
+    # ✅ 最后兜底：即使啥都没有，也别报错，直接指向 backend_dir/public/story.json
+    # 后面代码在写文件前会用 get_story_json_path().exists() 做检查，不会因为不存在就崩溃
+    return backend_dir / "public" / "story.json"
+
+
+@lru_cache(maxsize=None)
+def get_story_json_path() -> Path:
+    """STORY_JSON_PATH env var, or the discovered default; resolved once per process."""
+    env_path = os.getenv("STORY_JSON_PATH")
+    return Path(env_path) if env_path else _discover_default_story_path()
+
+
+def get_public_dir() -> Path:
+    return get_story_json_path().parent
+
+
+def get_upload_tmp_dir() -> Path:
+    """Temp dir for streamed uploads, next to (not inside) public.
+
+    Same filesystem as public so the final os.replace is atomic, but outside it so
+    the dev server never serves partial files and `vite build` never copies them.
+    """
+    return get_public_dir().parent / ".upload-tmp"
@@ -0,0 +1,145 @@
+"""Story payload 组装，以及从 section JSON 中提取引用的媒体地址。"""
+import json
+from pathlib import Path, PurePosixPath
+from typing import Iterable, List, Optional
+from urllib.parse import unquote, urlsplit
+
+from sqlalchemy.orm import Session, object_session
+
+import models
+
+# section JSON 中直接存放媒体地址的字段
+MEDIA_KEYS = ("src", "poster", "captions")
+# media_references / uploads / media_metadata 的 url 列长度
+MEDIA_URL_MAX_LENGTH = 512
+# 只有这个目录下的文件是上传产生的，media_gc 只回收这里
+UPLOADS_URL_PREFIX = "/media/uploads/"
+# 合并进 section / image 的元数据字段（已有的值不会被覆盖）
+METADATA_KEYS = ("width", "height", "duration", "size")
+
+
+def build_story_payload(story: models.Story) -> dict:
+    """Assemble a story payload compatible with story.json."""
+    payload = {
+        "id": story.id,
+        "version": story.version or "1.0",
+        "title": story.title or "Story",
+        "standfirst": story.standfirst or "",
+        "theme": {
+            "font": story.theme_font or "Montserrat",
+            "primaryColor": story.theme_primary_color or "#00007a",
+        },
+        "sections": [],
+    }
+
+    for section in story.sections:
+        raw_data = section.data or "{}"
+        try:
+            parsed = json.loads(raw_data)
+        except json.JSONDecodeError:
+            parsed = {"type": section.type}
+        payload["sections"].append(parsed)
+
+    session = object_session(story)
+    if session is not None:
+        merge_media_metadata(payload["sections"], load_media_metadata(session, payload["sections"]))
+
+    return payload
+
+
+def load_media_metadata(db: Session, sections: Iterable[dict]) -> dict:
+    """Fetch stored metadata for every media URL the sections reference, keyed by URL."""
+    urls = {normalize_media_url(url) for url in collect_story_media_urls(sections)}
+    if not urls:
+        return {}
+    rows = db.query(models.MediaMetadata).filter(models.MediaMetadata.url.in_(urls)).all()
+    return {row.url: row for row in rows}
+
+
+def _merge_into(item: dict, metadata: dict) -> None:
+    src = item.get("src")
+    row = metadata.get(normalize_media_url(src)) if isinstance(src, str) and src else None
+    if row is None:
+        return
+    for key in METADATA_KEYS:
+        value = getattr(row, key)
+        if value is not None:
+            item.setdefault(key, value)
+
+
+def merge_media_metadata(sections: Iterable[dict], metadata: dict) -> None:
+    """Add width / height / duration / size of each src to its section or image, in place."""
+    if not metadata:
+        return
+    for section in sections:
+        if not isinstance(section, dict):
+            continue
+        _merge_into(section, metadata)
+        for image in section.get("images") or []:
+            if isinstance(image, dict):
+                _merge_into(image, metadata)
+
+
+def collect_media_urls(section: dict) -> List[str]:
+    """Return every media URL a parsed section references, in document order."""
+    urls = []
+    for key in MEDIA_KEYS:
+        value = section.get(key)
+        if isinstance(value, str) and value:
+            urls.append(value)
+    for image in section.get("images") or []:
+        if isinstance(image, dict) and isinstance(image.get("src"), str) and image["src"]:
+            urls.append(image["src"])
+    for background in section.get("backgroundImages") or []:
+        if isinstance(background, str) and background:
+            urls.append(background)
+    return urls
+
+
+def collect_story_media_urls(sections: Iterable[dict]) -> List[str]:
+    """De-duplicated media URLs for a list of parsed sections, first use wins."""
+    seen = {}
+    for section in sections:
+        for url in collect_media_urls(section):
+            seen.setdefault(url, None)
+    return list(seen)
+
+
+def normalize_media_url(url: str) -> str:
+    """Canonical form used for reference lookups: decoded path for site-relative URLs."""
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc:
+        return url
+    return "/" + unquote(parts.path).lstrip("/")
+
+
+def media_reference_keys(url: str) -> List[str]:
+    """Keys under which url goes into the media reference index.
+
+    data: URIs and URLs longer than MEDIA_URL_MAX_LENGTH are not indexed. An absolute
+    URL pointing into /media/uploads/ is also indexed by its path, so media_gc never
+    treats an upload referenced as https://<site>/media/uploads/x.png as an orphan.
+    """
+    if not url or url[:5].lower() == "data:":
+        return []
+    keys = [normalize_media_url(url)]
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc:
+        path = "/" + unquote(parts.path).lstrip("/")
+        if path.startswith(UPLOADS_URL_PREFIX):
+            keys.append(path)
+    return [key for key in keys if len(key) <= MEDIA_URL_MAX_LENGTH]
+
+
+def media_file_path(public_dir: Path, url: str) -> Optional[Path]:
+    """Map a site-relative media URL (e.g. /media/uploads/a.png) to a file under public_dir.
+
+    Returns None for external URLs or paths that would escape public_dir.
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path.startswith("/"):
+        return None
+    pure = PurePosixPath(unquote(parts.path).lstrip("/"))
+    if not pure.parts or any(part == ".." for part in pure.parts):
+        return None
+    return public_dir / Path(*pure.parts)
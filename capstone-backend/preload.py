@@ -0,0 +1,225 @@
+"""首屏关键资源（hero / 首个 video poster、前 N 张图片、主题字体）的 preload 清单。
+
+清单按 story 缓存在进程内，用 crud.get_story_fingerprint 判断是否过期，
+多 worker 下各自缓存也不会读到旧数据。输出为 `Link: rel=preload` 头，
+服务器支持 ASGI early hint 扩展时（如 Hypercorn）还会先发 103 Early Hints。
+
+浏览器只在页面导航响应上处理 Link preload / 103，API 的 JSON 响应上的 Link 头
+主要给 CDN / 边缘节点用；真正缩短 LCP 的是页面（或 SSR）读取 /stories/{id}/preload
+后注入的 <link rel=preload>。媒体文件在前端站点上，API 是另一个域名，所以 Link 头里的
+站内路径按 PRELOAD_MEDIA_ORIGIN 转成绝对地址；没有配置时只输出本来就是绝对地址的资源。
+"""
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import PurePosixPath
+from typing import Iterable, List, Optional
+from urllib.parse import quote, urlsplit
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import crud, models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_IMAGE_COUNT = int(os.getenv("PRELOAD_IMAGE_COUNT", "2"))
+# 主题字体是 Google Fonts 的 family 名（与 index.html 里的样式表一致）
+PRELOAD_FONT_CSS_URL = os.getenv(
+    "PRELOAD_FONT_CSS_URL",
+    "https://fonts.googleapis.com/css2?family={family}:wght@400;600;800&display=swap",
+)
+PRELOAD_FONT_ORIGIN = os.getenv("PRELOAD_FONT_ORIGIN", "https://fonts.gstatic.com")
+# 前端站点（public 目录）的地址，例如 https://example.github.io/app
+PRELOAD_MEDIA_ORIGIN = os.getenv("PRELOAD_MEDIA_ORIGIN", "").rstrip("/")
+CACHE_SIZE = 256
+
+FONT_FILE_TYPES = {".woff2": "font/woff2", ".woff": "font/woff", ".ttf": "font/ttf", ".otf": "font/otf"}
+# Link 头只能是 ASCII；已编码的 %XX 保持不变
+URL_SAFE_CHARS = ":/?#[]@!$&'()*+,;=%~"
+
+EARLY_HINT_EXTENSION = "http.response.early_hint"
+STORY_PATH = re.compile(r"^/(?:story|stories/(\d+))$")
+
+_cache: "OrderedDict[int, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _asset(href: str, as_: str, **extra) -> dict:
+    asset = {"rel": "preload", "href": href, "as": as_}
+    path = urlsplit(href).path
+    guessed = FONT_FILE_TYPES.get(PurePosixPath(path).suffix.lower()) or mimetypes.guess_type(path)[0]
+    if guessed:
+        asset["type"] = guessed
+    asset.update(extra)
+    return asset
+
+
+def _image_urls(section: dict) -> List[str]:
+    """Images a section shows on first paint, in document order."""
+    kind = section.get("type")
+    if kind == "image":
+        candidates = [section.get("src")]
+    elif kind == "imagegroup":
+        candidates = [image.get("src") for image in section.get("images") or [] if isinstance(image, dict)]
+    elif kind == "scrollytelling":
+        # 只有第一张背景图在进入时可见
+        candidates = (section.get("backgroundImages") or [])[:1]
+    else:
+        candidates = []
+    return [url for url in candidates if isinstance(url, str) and url]
+
+
+def collect_critical_assets(sections: Iterable[dict], font: Optional[str], image_count: int = PRELOAD_IMAGE_COUNT) -> List[dict]:
+    """First video poster, the first image_count images and the theme font, first asset at high priority."""
+    assets = []
+    seen = set()
+    poster_found = False
+    images_left = image_count
+    for section in sections:
+        if poster_found and images_left <= 0:
+            break
+        if not isinstance(section, dict):
+            continue
+        if section.get("type") == "video":
+            poster = section.get("poster")
+            if not poster_found and isinstance(poster, str) and poster:
+                poster_found = True
+                if poster not in seen:
+                    seen.add(poster)
+                    assets.append(_asset(poster, "image"))
+            continue
+        for url in _image_urls(section):
+            if images_left <= 0:
+                break
+            # 同一张图可能重复出现（poster 也可能当作 image 使用）
+            if url in seen:
+                continue
+            seen.add(url)
+            assets.append(_asset(url, "image"))
+            images_left -= 1
+
+    if assets:
+        assets[0]["fetchpriority"] = "high"
+
+    if font:
+        if PurePosixPath(urlsplit(font).path).suffix.lower() in FONT_FILE_TYPES:
+            assets.append(_asset(font, "font", crossorigin=True))
+        else:
+            assets.append(_asset(PRELOAD_FONT_CSS_URL.format(family=quote(font.strip()).replace("%20", "+")), "style"))
+            if PRELOAD_FONT_ORIGIN:
+                assets.append({"rel": "preconnect", "href": PRELOAD_FONT_ORIGIN, "crossorigin": True})
+    return assets
+
+
+def build_manifest(story: models.Story) -> List[dict]:
+    sections = []
+    for section in story.sections:
+        try:
+            sections.append(json.loads(section.data or "{}"))
+        except json.JSONDecodeError:
+            continue
+    return collect_critical_assets(sections, story.theme_font or "Montserrat")
+
+
+def get_manifest(db: Session, story_id: int) -> Optional[List[dict]]:
+    """Cached critical-asset list for a story; None when the story does not exist."""
+    fingerprint = crud.get_story_fingerprint(db, story_id)
+    if fingerprint is None:
+        return None
+    with _cache_lock:
+        cached = _cache.get(story_id)
+        if cached is not None and cached[0] == fingerprint:
+            _cache.move_to_end(story_id)
+            return cached[1]
+
+    manifest = build_manifest(crud.get_story(db, story_id))
+    with _cache_lock:
+        _cache[story_id] = (fingerprint, manifest)
+        _cache.move_to_end(story_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return manifest
+
+
+def absolute_href(href: str, media_origin: Optional[str] = None) -> Optional[str]:
+    """href resolved against the frontend origin; None for site-relative paths when it is not configured."""
+    if media_origin is None:
+        media_origin = PRELOAD_MEDIA_ORIGIN
+    parts = urlsplit(href)
+    if parts.scheme or parts.netloc:
+        return href
+    if not media_origin:
+        return None
+    return f"{media_origin}/{href.lstrip('/')}"
+
+
+def format_link(asset: dict) -> Optional[str]:
+    """One Link header value, or None when the href cannot be made absolute."""
+    href = absolute_href(asset["href"])
+    if href is None:
+        return None
+    parts = [f"<{quote(href, safe=URL_SAFE_CHARS)}>", f"rel={asset['rel']}"]
+    if asset.get("as"):
+        parts.append(f"as={asset['as']}")
+    if asset.get("type"):
+        parts.append(f'type="{asset["type"]}"')
+    if asset.get("crossorigin"):
+        parts.append("crossorigin")
+    if asset.get("fetchpriority"):
+        parts.append(f"fetchpriority={asset['fetchpriority']}")
+    return "; ".join(parts)
+
+
+def format_links(manifest: Iterable[dict]) -> List[str]:
+    return [link for link in (format_link(asset) for asset in manifest) if link is not None]
+
+
+def link_header(manifest: Iterable[dict]) -> str:
+    return ", ".join(format_links(manifest))
+
+
+def _links_for_story(story_id: Optional[int]) -> List[str]:
+    db = SessionLocal()
+    try:
+        if story_id is None:
+            story_id = crud.get_latest_story_id(db)
+            if story_id is None:
+                return []
+        return format_links(get_manifest(db, story_id) or [])
+    except Exception as exc:
+        # Early Hints 只是优化，失败时让正式响应照常处理
+        logger.warning("Failed to compute early hints for story %s: %s", story_id, exc)
+        return []
+    finally:
+        db.close()
+
+
+class EarlyHintsMiddleware:
+    """Send 103 Early Hints for GET /story and /stories/{id} before the full payload is built.
+
+    Only active when the server advertises the ASGI `http.response.early_hint`
+    extension; elsewhere the Link headers on the final response carry the same list.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "GET"
+            and EARLY_HINT_EXTENSION in (scope.get("extensions") or {})
+        ):
+            match = STORY_PATH.match(scope["path"])
+            if match:
+                story_id = int(match.group(1)) if match.group(1) else None
+                links = await run_in_threadpool(_links_for_story, story_id)
+                if links:
+                    await send({"type": EARLY_HINT_EXTENSION, "links": [link.encode("latin-1") for link in links]})
+        await self.app(scope, receive, send)
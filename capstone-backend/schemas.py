@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 import json
 
@@ -25,11 +25,30 @@ class SectionBase(BaseModel):
     sort_order: int = 0
 
 class SectionCreate(SectionBase):
-    pass
+    @field_validator("data")
+    @classmethod
+    def data_must_be_json(cls, value: str) -> str:
+        # data 存在 JSON 列里，非法 JSON 会被数据库拒绝
+        try:
+            json.loads(value)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"data must be a JSON string: {exc}")
+        return value
 
 class SectionRead(SectionBase):
     id: int
     story_id: int
+    row_version: int = 1
+    class Config:
+        from_attributes = True
+
+class SectionSummary(BaseModel):
+    """列表用的精简视图：不包含 data"""
+    id: int
+    story_id: int
+    type: str
+    sort_order: int = 0
+    row_version: int = 1
     class Config:
         from_attributes = True
 
@@ -50,6 +69,7 @@ class StoryRead(StoryBase):
     id: int
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    row_version: int = 1
     sections: List[SectionRead] = []
     class Config:
         from_attributes = True
@@ -74,6 +94,18 @@ class PostUpdate(BaseModel):
 class PostRead(PostBase):
     id: int
     updated_at: Optional[datetime] = None
+    row_version: int = 1
     media: List[MediaRead] = []
     class Config:
         from_attributes = True
+
+class PostSummary(BaseModel):
+    """列表用的精简视图：不包含 content 和 media"""
+    id: int
+    title: Optional[str] = None
+    author: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    row_version: int = 1
+    class Config:
+        from_attributes = True
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""静态导出：把每个 story 渲染成带内容哈希的 JSON（附 .gz / .br 预压缩文件）。
+
+输出目录结构（默认 <public>/stories）::
+
+    story-6.3f2a9c1d0b7e4a55.json      内容哈希文件名，可长期缓存
+    story-6.3f2a9c1d0b7e4a55.json.gz
+    story-6.3f2a9c1d0b7e4a55.json.br   安装了 Brotli 时生成
+    media-manifest.json                引用的媒体：大小 + sha256
+    index.json                         story id -> 当前哈希文件（短缓存的指针文件）
+
+导出是增量的：payload 哈希与 index.json 中记录的一致时跳过该 story。
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+import crud, models
+from payloads import build_story_payload, collect_story_media_urls, media_file_path
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+INDEX_NAME = "index.json"
+MEDIA_MANIFEST_NAME = "media-manifest.json"
+HASH_LENGTH = 16
+
+logger = logging.getLogger(__name__)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path, default: dict) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_story(story: models.Story) -> bytes:
+    payload = build_story_payload(story)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_bundle(export_dir: Path, story_id: int, body: bytes, content_hash: str) -> str:
+    """Write story-<id>.<hash>.json plus precompressed siblings; return the file name."""
+    name = f"story-{story_id}.{content_hash}.json"
+    _write_atomic(export_dir / f"{name}.gz", gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(export_dir / f"{name}.br", brotli.compress(body, quality=11))
+    # 先写压缩文件，最后写 .json，保证 .json 出现时兄弟文件都已就绪
+    _write_atomic(export_dir / name, body)
+    return name
+
+
+def prune_bundles(export_dir: Path, story_id: int, keep: Iterable[str]) -> None:
+    """Remove old bundles of a story, keeping the given file names (and their siblings)."""
+    keep = set(keep)
+    for path in export_dir.glob(f"story-{story_id}.*.json*"):
+        base = path.name
+        for suffix in (".gz", ".br"):
+            if base.endswith(suffix):
+                base = base[: -len(suffix)]
+        if base not in keep:
+            path.unlink(missing_ok=True)
+
+
+def build_media_manifest(public_dir: Path, index: dict, previous: dict) -> dict:
+    """Collect size and sha256 of every local media file referenced by exported stories."""
+    manifest = {}
+    for story_id, entry in sorted(index.get("stories", {}).items(), key=lambda item: int(item[0])):
+        for url in entry.get("media", []):
+            item = manifest.get(url)
+            if item is None:
+                item = manifest[url] = {"stories": []}
+                path = media_file_path(public_dir, url)
+                if path is None:
+                    item["external"] = True
+                elif path.is_file():
+                    stat = path.stat()
+                    cached = previous.get(url, {})
+                    if cached.get("size") == stat.st_size and cached.get("mtime") == int(stat.st_mtime):
+                        item["sha256"] = cached.get("sha256")
+                    else:
+                        item["sha256"] = _file_digest(path)
+                    item["size"] = stat.st_size
+                    item["mtime"] = int(stat.st_mtime)
+                else:
+                    item["missing"] = True
+            item["stories"].append(int(story_id))
+    return manifest
+
+
+def export_stories(
+    db: Session,
+    public_dir: Path,
+    export_dir: Optional[Path] = None,
+    story_ids: Optional[Iterable[int]] = None,
+    force: bool = False,
+) -> dict:
+    """Export stories incrementally and return a report of what was written."""
+    export_dir = export_dir or public_dir / "stories"
+    export_dir.mkdir(parents=True, exist_ok=True)
+    index_path = export_dir / INDEX_NAME
+    index = _read_json(index_path, {"stories": {}})
+    index.setdefault("stories", {})
+
+    query = db.query(models.Story).order_by(models.Story.id.asc())
+    if story_ids is not None:
+        query = query.filter(models.Story.id.in_(list(story_ids)))
+    else:
+        # 全量导出时，去掉数据库里已经不存在的 story
+        existing = {str(row.id) for row in db.query(models.Story.id)}
+        for stale_id in set(index["stories"]) - existing:
+            prune_bundles(export_dir, int(stale_id), keep=())
+            index["stories"].pop(stale_id)
+
+    report = {"written": [], "skipped": [], "brotli": brotli is not None}
+    for story in query:
+        body = render_story(story)
+        content_hash = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        key = str(story.id)
+        previous = index["stories"].get(key, {})
+        if not force and previous.get("hash") == content_hash and (export_dir / previous.get("file", "")).is_file():
+            report["skipped"].append(story.id)
+            continue
+
+        name = write_bundle(export_dir, story.id, body, content_hash)
+        # 保留上一版，避免正在读取旧指针的客户端拿到 404
+        prune_bundles(export_dir, story.id, keep=(name, previous.get("file")))
+        sections = json.loads(body)["sections"]
+        index["stories"][key] = {
+            "hash": content_hash,
+            "file": name,
+            "bytes": len(body),
+            "media": collect_story_media_urls(sections),
+        }
+        report["written"].append({"id": story.id, "file": name, "bytes": len(body)})
+
+    # 与 GET /story 相同的规则：created_at 最新的 story
+    latest = crud.get_latest_story_id(db, [int(story_id) for story_id in index["stories"]]) if index["stories"] else None
+    if latest is not None:
+        index["latest"] = latest
+    else:
+        index.pop("latest", None)
+
+    manifest_path = export_dir / MEDIA_MANIFEST_NAME
+    manifest = build_media_manifest(public_dir, index, _read_json(manifest_path, {}))
+    _write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    # 指针文件最后写入：读者看到新哈希时，对应的文件已经全部落盘
+    _write_atomic(index_path, json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"))
+    logger.info("Static export: %d written, %d unchanged", len(report["written"]), len(report["skipped"]))
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export stories as hashed, precompressed static JSON bundles")
+    parser.add_argument("--story", type=int, action="append", help="only export this story id (repeatable)")
+    parser.add_argument("--out", type=Path, help="output directory (default: <public>/stories)")
+    parser.add_argument("--force", action="store_true", help="rewrite bundles even if the hash is unchanged")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    from paths import get_public_dir
+
+    db = SessionLocal()
+    try:
+        result = export_stories(db, get_public_dir(), export_dir=args.out, story_ids=args.story, force=args.force)
+    finally:
+        db.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
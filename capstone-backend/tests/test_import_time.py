@@ -0,0 +1,7 @@
+"""冷启动预算：复用 check_import_time.measure()，让 `pytest tests` 也覆盖 import main 的耗时。"""
+from check_import_time import IMPORT_TIME_BUDGET_SECONDS, measure
+
+
+def test_import_main_within_budget():
+    best = measure(3)
+    assert best <= IMPORT_TIME_BUDGET_SECONDS, f"import main: {best:.3f}s (budget {IMPORT_TIME_BUDGET_SECONDS:.3f}s)"
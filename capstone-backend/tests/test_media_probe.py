@@ -0,0 +1,117 @@
+"""media_probe.py 的解析测试：用手工拼出的最小文件头覆盖各格式，外加 EXIF / tkhd 的旋转。"""
+import struct
+from pathlib import Path
+
+import pytest
+
+from media_probe import probe_file
+
+
+def _jpeg(width, height, orientation=None, byte_order="MM"):
+    segments = b""
+    if orientation is not None:
+        order = ">" if byte_order == "MM" else "<"
+        # TIFF 头 + IFD0：一个 entry（Orientation, SHORT, count 1）
+        tiff = byte_order.encode() + struct.pack(order + "HI", 42, 8)
+        tiff += struct.pack(order + "H", 1) + struct.pack(order + "HHIHH", 0x0112, 3, 1, orientation, 0)
+        tiff += struct.pack(order + "I", 0)
+        body = b"Exif\x00\x00" + tiff
+        segments += b"\xFF\xE1" + struct.pack(">H", len(body) + 2) + body
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    return (
+        b"\xFF\xD8"
+        + b"\xFF\xE0" + struct.pack(">H", len(app0) + 2) + app0
+        + segments
+        + b"\xFF\xC0" + struct.pack(">H", len(sof) + 2) + sof
+        + b"\xFF\xD9"
+    )
+
+
+def _box(box_type, body):
+    return struct.pack(">I4s", len(body) + 8, box_type) + body
+
+
+ROTATE_0 = (0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+ROTATE_90 = (0, 0x10000, 0, -0x10000, 0, 0, 0, 0, 0x40000000)
+ROTATE_180 = (-0x10000, 0, 0, 0, -0x10000, 0, 0, 0, 0x40000000)
+
+
+def _mp4(width, height, matrix=ROTATE_0, duration=15, timescale=1000):
+    mvhd = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration * timescale) + bytes(80)
+    tkhd = (
+        struct.pack(">B3xIIIII", 0, 0, 0, 1, 0, duration * timescale)
+        + bytes(8) + struct.pack(">hhhH", 0, 0, 0, 0)
+        + struct.pack(">9i", *matrix)
+        + struct.pack(">II", width << 16, height << 16)
+    )
+    audio_tkhd = tkhd[:-8] + bytes(8)
+    moov = _box(b"mvhd", mvhd) + _box(b"trak", _box(b"tkhd", audio_tkhd)) + _box(b"trak", _box(b"tkhd", tkhd))
+    return _box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41") + _box(b"moov", moov)
+
+
+def _png(width, height):
+    ihdr = struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4s", len(ihdr), b"IHDR") + ihdr + b"\x00" * 4
+
+
+def _gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00" * 22
+
+
+def _webp_vp8x(width, height):
+    chunk = b"\x00" * 4 + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little")
+    return b"RIFF" + struct.pack("<I", 4 + 8 + len(chunk)) + b"WEBP" + b"VP8X" + struct.pack("<I", len(chunk)) + chunk
+
+
+PROBE_CASES = [
+    ("png", _png(444, 460), {"format": "png", "width": 444, "height": 460}),
+    ("gif", _gif(320, 240), {"format": "gif", "width": 320, "height": 240}),
+    ("webp VP8X", _webp_vp8x(1600, 900), {"format": "webp", "width": 1600, "height": 900}),
+    ("jpeg without exif", _jpeg(4032, 3024), {"format": "jpeg", "width": 4032, "height": 3024}),
+    ("jpeg orientation 1", _jpeg(4032, 3024, 1), {"format": "jpeg", "width": 4032, "height": 3024}),
+    ("jpeg orientation 3", _jpeg(4032, 3024, 3), {"format": "jpeg", "width": 4032, "height": 3024}),
+    ("jpeg orientation 6 big-endian", _jpeg(4032, 3024, 6), {"format": "jpeg", "width": 3024, "height": 4032}),
+    ("jpeg orientation 6 little-endian", _jpeg(4032, 3024, 6, "II"), {"format": "jpeg", "width": 3024, "height": 4032}),
+    ("jpeg orientation 8", _jpeg(4032, 3024, 8), {"format": "jpeg", "width": 3024, "height": 4032}),
+    ("jpeg orientation 5", _jpeg(4032, 3024, 5, "II"), {"format": "jpeg", "width": 3024, "height": 4032}),
+    ("mp4 landscape", _mp4(1280, 720), {"format": "mp4", "width": 1280, "height": 720, "duration": 15.0}),
+    ("mp4 rotated 90", _mp4(1920, 1080, ROTATE_90), {"format": "mp4", "width": 1080, "height": 1920, "duration": 15.0}),
+    ("mp4 rotated 180", _mp4(1920, 1080, ROTATE_180), {"format": "mp4", "width": 1920, "height": 1080, "duration": 15.0}),
+]
+
+
+@pytest.mark.parametrize("name, data, expected", PROBE_CASES, ids=[c[0] for c in PROBE_CASES])
+def test_probe_file(tmp_path, name, data, expected):
+    path = tmp_path / "media"
+    path.write_bytes(data)
+    assert probe_file(path) == dict(expected, size=len(data))
+
+
+@pytest.mark.parametrize("name, data", [
+    ("unknown format", b"not a media file at all, just text"),
+    ("truncated jpeg", _jpeg(4032, 3024, 6)[:40]),
+], ids=lambda value: value if isinstance(value, str) else "")
+def test_probe_file_without_metadata(tmp_path, name, data):
+    path = tmp_path / "media"
+    path.write_bytes(data)
+    assert probe_file(path) == {"size": len(data)}
+
+
+def test_probe_file_corrupt_exif_keeps_dimensions(tmp_path):
+    # IFD 偏移越界：忽略 EXIF，按像素方向返回
+    data = _jpeg(4032, 3024, 6).replace(b"MM\x00\x2a\x00\x00\x00\x08", b"MM\x00\x2a\xff\xff\xff\xff")
+    path = tmp_path / "media"
+    path.write_bytes(data)
+    assert probe_file(path) == {"size": len(data), "format": "jpeg", "width": 4032, "height": 3024}
+
+
+PHOTOS_DIR = Path(__file__).resolve().parents[2] / "capstone-frontend" / "public" / "media" / "photos"
+
+
+@pytest.mark.skipif(not PHOTOS_DIR.is_dir(), reason="frontend media not checked out")
+@pytest.mark.parametrize("filename", ["IMG_1190.jpeg", "IMG_4752.jpeg"])
+def test_probe_file_portrait_photo(filename):
+    # iPhone 竖拍：像素是 4032x3024，EXIF Orientation=6
+    info = probe_file(PHOTOS_DIR / filename)
+    assert (info["width"], info["height"]) == (3024, 4032)
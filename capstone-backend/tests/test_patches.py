@@ -0,0 +1,155 @@
+"""patches.py 的表驱动测试：RFC 6902 / RFC 7396 附录中的示例，外加几个边界情况。"""
+import copy
+
+import pytest
+
+from patches import PatchError, PatchTestFailed, json_patch, merge_patch
+
+# RFC 6902 Appendix A（A.13 的重复 "op" 键在 Python dict 中无法表示，略过）
+JSON_PATCH_CASES = [
+    ("A.1 add object member",
+     {"foo": "bar"},
+     [{"op": "add", "path": "/baz", "value": "qux"}],
+     {"baz": "qux", "foo": "bar"}),
+    ("A.2 add array element",
+     {"foo": ["bar", "baz"]},
+     [{"op": "add", "path": "/foo/1", "value": "qux"}],
+     {"foo": ["bar", "qux", "baz"]}),
+    ("A.3 remove object member",
+     {"baz": "qux", "foo": "bar"},
+     [{"op": "remove", "path": "/baz"}],
+     {"foo": "bar"}),
+    ("A.4 remove array element",
+     {"foo": ["bar", "qux", "baz"]},
+     [{"op": "remove", "path": "/foo/1"}],
+     {"foo": ["bar", "baz"]}),
+    ("A.5 replace value",
+     {"baz": "qux", "foo": "bar"},
+     [{"op": "replace", "path": "/baz", "value": "boo"}],
+     {"baz": "boo", "foo": "bar"}),
+    ("A.6 move value",
+     {"foo": {"bar": "baz", "waldo": "fred"}, "qux": {"corge": "grault"}},
+     [{"op": "move", "from": "/foo/waldo", "path": "/qux/thud"}],
+     {"foo": {"bar": "baz"}, "qux": {"corge": "grault", "thud": "fred"}}),
+    ("A.7 move array element",
+     {"foo": ["all", "grass", "cows", "eat"]},
+     [{"op": "move", "from": "/foo/1", "path": "/foo/3"}],
+     {"foo": ["all", "cows", "eat", "grass"]}),
+    ("A.8 test value success",
+     {"baz": "qux", "foo": ["a", 2, "c"]},
+     [{"op": "test", "path": "/baz", "value": "qux"}, {"op": "test", "path": "/foo/1", "value": 2}],
+     {"baz": "qux", "foo": ["a", 2, "c"]}),
+    ("A.10 add nested member object",
+     {"foo": "bar"},
+     [{"op": "add", "path": "/child", "value": {"grandchild": {}}}],
+     {"foo": "bar", "child": {"grandchild": {}}}),
+    ("A.11 ignore unrecognized elements",
+     {"foo": "bar"},
+     [{"op": "add", "path": "/baz", "value": "qux", "xyz": 123}],
+     {"foo": "bar", "baz": "qux"}),
+    ("A.14 ~ escape ordering",
+     {"/": 9, "~1": 10},
+     [{"op": "test", "path": "/~01", "value": 10}],
+     {"/": 9, "~1": 10}),
+    ("A.16 add array value",
+     {"foo": ["bar"]},
+     [{"op": "add", "path": "/foo/-", "value": ["abc", "def"]}],
+     {"foo": ["bar", ["abc", "def"]]}),
+    ("copy value",
+     {"a": {"b": 1}},
+     [{"op": "copy", "from": "/a", "path": "/c"}],
+     {"a": {"b": 1}, "c": {"b": 1}}),
+    ("replace root",
+     {"a": 1},
+     [{"op": "replace", "path": "", "value": [1]}],
+     [1]),
+    ("test integer equals float",
+     {"n": 1},
+     [{"op": "test", "path": "/n", "value": 1.0}],
+     {"n": 1}),
+]
+
+JSON_PATCH_ERRORS = [
+    ("A.9 test value error", {"baz": "qux"},
+     [{"op": "test", "path": "/baz", "value": "bar"}], PatchTestFailed),
+    ("A.12 add to nonexistent target", {"foo": "bar"},
+     [{"op": "add", "path": "/baz/bat", "value": "qux"}], PatchError),
+    ("A.15 compare string and number", {"/": 9, "~1": 10},
+     [{"op": "test", "path": "/~01", "value": "10"}], PatchTestFailed),
+    ("test true against 1", {"flag": True},
+     [{"op": "test", "path": "/flag", "value": 1}], PatchTestFailed),
+    ("test nested false against 0", {"a": [False]},
+     [{"op": "test", "path": "/a", "value": [0]}], PatchTestFailed),
+    ("test null against false", {"a": None},
+     [{"op": "test", "path": "/a", "value": False}], PatchTestFailed),
+    ("non-string path", {"a": 1},
+     [{"op": "replace", "path": 1, "value": "x"}], PatchError),
+    ("non-string from", {"a": 1},
+     [{"op": "move", "from": ["a"], "path": "/b"}], PatchError),
+    ("pointer without leading slash", {"a": 1},
+     [{"op": "remove", "path": "a"}], PatchError),
+    ("array index with leading zero", {"a": [1, 2]},
+     [{"op": "remove", "path": "/a/01"}], PatchError),
+    ("array index out of range", {"a": [1]},
+     [{"op": "add", "path": "/a/2", "value": 3}], PatchError),
+    ("move into own child", {"a": {"b": {}}},
+     [{"op": "move", "from": "/a", "path": "/a/b/c"}], PatchError),
+    ("missing value", {"a": 1},
+     [{"op": "add", "path": "/b"}], PatchError),
+    ("unknown operation", {"a": 1},
+     [{"op": "increment", "path": "/a"}], PatchError),
+    ("not an array", {"a": 1},
+     {"op": "remove", "path": "/a"}, PatchError),
+]
+
+# RFC 7396 Appendix A
+MERGE_PATCH_CASES = [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    (["a", "b"], ["c", "d"], ["c", "d"]),
+    ({"a": "b"}, ["c"], ["c"]),
+    ({"a": "foo"}, None, None),
+    ({"a": "foo"}, "bar", "bar"),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+]
+
+
+@pytest.mark.parametrize("name, target, operations, expected", JSON_PATCH_CASES, ids=[c[0] for c in JSON_PATCH_CASES])
+def test_json_patch(name, target, operations, expected):
+    original = copy.deepcopy(target)
+    assert json_patch(target, operations) == expected
+    assert target == original
+
+
+@pytest.mark.parametrize("name, target, operations, error", JSON_PATCH_ERRORS, ids=[c[0] for c in JSON_PATCH_ERRORS])
+def test_json_patch_errors(name, target, operations, error):
+    original = copy.deepcopy(target)
+    with pytest.raises(error):
+        json_patch(target, operations)
+    assert target == original
+
+
+def test_json_patch_is_all_or_nothing():
+    target = {"a": 1}
+    operations = [
+        {"op": "replace", "path": "/a", "value": 2},
+        {"op": "test", "path": "/a", "value": 3},
+    ]
+    with pytest.raises(PatchTestFailed):
+        json_patch(target, operations)
+    assert target == {"a": 1}
+
+
+@pytest.mark.parametrize("target, patch, expected", MERGE_PATCH_CASES)
+def test_merge_patch(target, patch, expected):
+    original = copy.deepcopy(target)
+    assert merge_patch(target, patch) == expected
+    assert target == original
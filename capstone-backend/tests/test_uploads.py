@@ -0,0 +1,112 @@
+"""uploads.receive_multipart 的测试：字段顺序、截断的请求体、流式大小限制。"""
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from uploads import UploadRejected, receive_multipart
+
+BOUNDARY = "----testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+FILE_DATA = b"0123456789" * 30
+MAX_BYTES = 1024
+
+
+def _field(name, value):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode()
+        + value.encode() + b"\r\n"
+    )
+
+
+def _file(data, filename="photo.jpg"):
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n".encode()
+        + data + b"\r\n"
+    )
+
+
+CLOSING = f"--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    return tmp_path / ".upload-tmp"
+
+
+@pytest.fixture
+def client(tmp_dir):
+    async def upload(request):
+        try:
+            received = await receive_multipart(request, tmp_dir, max_bytes=MAX_BYTES)
+        except UploadRejected as exc:
+            return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+        data = received.tmp_path.read_bytes()
+        received.discard()
+        return JSONResponse({"fields": received.fields, "filename": received.filename, "size": received.size, "data": data.decode()})
+
+    return TestClient(Starlette(routes=[Route("/upload", upload, methods=["POST"])]))
+
+
+def _leftover_parts(tmp_dir):
+    return list(tmp_dir.glob("*.part")) if tmp_dir.exists() else []
+
+
+@pytest.mark.parametrize("body", [
+    _field("target_path", "/media/uploads/photo.jpg") + _file(FILE_DATA) + CLOSING,
+    _file(FILE_DATA) + _field("target_path", "/media/uploads/photo.jpg") + CLOSING,
+], ids=["target_path first", "file first"])
+def test_receive_multipart_field_order(client, tmp_dir, body):
+    response = client.post("/upload", content=body, headers={"Content-Type": CONTENT_TYPE})
+    assert response.status_code == 200
+    assert response.json() == {
+        "fields": {"target_path": "/media/uploads/photo.jpg"},
+        "filename": "photo.jpg",
+        "size": len(FILE_DATA),
+        "data": FILE_DATA.decode(),
+    }
+    assert _leftover_parts(tmp_dir) == []
+
+
+@pytest.mark.parametrize("body", [
+    _field("target_path", "/media/uploads/photo.jpg") + _file(FILE_DATA),
+    _field("target_path", "/media/uploads/photo.jpg") + _file(FILE_DATA)[:-50],
+    _file(FILE_DATA) + _field("target_path", "/media/uploads/photo.jpg"),
+], ids=["missing closing boundary", "cut inside file", "cut after last field"])
+def test_receive_multipart_rejects_truncated_body(client, tmp_dir, body):
+    response = client.post("/upload", content=body, headers={"Content-Type": CONTENT_TYPE})
+    assert response.status_code == 400
+    assert "Incomplete" in response.json()["detail"]
+    assert _leftover_parts(tmp_dir) == []
+
+
+def test_receive_multipart_rejects_oversized_chunked_body(client, tmp_dir):
+    body = _field("target_path", "/media/uploads/big.bin") + _file(b"x" * (MAX_BYTES * 4)) + CLOSING
+
+    def chunks():
+        # 生成器请求体没有 Content-Length，只能边收边数
+        for start in range(0, len(body), 256):
+            yield body[start:start + 256]
+
+    response = client.post("/upload", content=chunks(), headers={"Content-Type": CONTENT_TYPE})
+    assert response.status_code == 413
+    assert _leftover_parts(tmp_dir) == []
+
+
+def test_receive_multipart_rejects_oversized_content_length(client, tmp_dir):
+    body = _file(b"x" * (MAX_BYTES * 8)) + CLOSING
+    response = client.post("/upload", content=body, headers={"Content-Type": CONTENT_TYPE})
+    assert response.status_code == 413
+    assert _leftover_parts(tmp_dir) == []
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (_field("target_path", "/media/uploads/photo.jpg") + CLOSING, CONTENT_TYPE),
+    (_file(FILE_DATA) + CLOSING, "application/octet-stream"),
+], ids=["missing file field", "not multipart"])
+def test_receive_multipart_rejects_bad_request(client, tmp_dir, body, content_type):
+    response = client.post("/upload", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 400
+    assert _leftover_parts(tmp_dir) == []
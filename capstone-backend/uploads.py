@@ -0,0 +1,202 @@
+"""上传准入控制：流式大小限制、并发上限，以及直接写入目标目录（不经过临时 spool 再复制）。
+
+/upload 的 multipart 请求体在这里边收边解析：文件部分直接写进 public 旁边（同一文件系统）
+的临时目录，完成后用 os.replace 原子改名到最终路径，每个字节只写一次磁盘。
+"""
+import os
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有 flock，并发上限退化为每个进程各自计数
+    fcntl = None
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+# 同一台机器上所有 worker 合计同时处理的上传数（共享临时目录下的锁文件）
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+UPLOAD_RETRY_AFTER_SECONDS = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", "5"))
+FIELD_MAX_BYTES = 4096
+SLOTS_DIR_NAME = "slots"
+
+
+class UploadRejected(Exception):
+    """The upload was refused; carries the HTTP status, detail and headers."""
+    def __init__(self, status_code: int, detail: str, headers: Optional[dict] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers or {}
+
+
+class UploadSlots:
+    """Non-blocking concurrency cap shared by every worker that uses the same lock_dir.
+
+    Each slot is an flock on <lock_dir>/slot-<n>.lock, so the cap is global across
+    uvicorn workers on one host and the OS frees a slot if its worker dies. Without
+    fcntl (Windows) only the in-process counter applies.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def _reject(self):
+        return UploadRejected(
+            503,
+            "Too many concurrent uploads, please retry later",
+            {"Retry-After": str(UPLOAD_RETRY_AFTER_SECONDS)},
+        )
+
+    def _lock_free_slot(self, lock_dir: Path) -> Optional[int]:
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        for slot in range(self.limit):
+            fd = os.open(lock_dir / f"slot-{slot}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @contextmanager
+    def claim(self, lock_dir: Path):
+        if self.active >= self.limit:
+            raise self._reject()
+        fd = None
+        if fcntl is not None:
+            fd = self._lock_free_slot(lock_dir)
+            if fd is None:
+                raise self._reject()
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+upload_slots = UploadSlots(UPLOAD_MAX_CONCURRENCY)
+
+
+class StreamedUpload:
+    """Result of receive_multipart: form fields plus the file written to tmp_path."""
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.tmp_path: Optional[Path] = None
+        self.size = 0
+
+    def discard(self) -> None:
+        if self.tmp_path is not None:
+            self.tmp_path.unlink(missing_ok=True)
+            self.tmp_path = None
+
+
+async def receive_multipart(request: Request, tmp_dir: Path, file_field: str = "file", max_bytes: int = UPLOAD_MAX_BYTES) -> StreamedUpload:
+    """Stream a multipart body, writing file_field to tmp_dir and enforcing max_bytes as it arrives."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + FIELD_MAX_BYTES:
+        raise UploadRejected(413, f"Upload exceeds {max_bytes} bytes")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(400, "Expected multipart/form-data")
+
+    result = StreamedUpload()
+    state = {"name": None, "header_field": b"", "header_value": b"", "headers": {}, "buffer": None, "ended": False}
+    pending = []  # file chunks parsed from the current network chunk
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["name"] = None
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        state["name"] = name
+        if name == file_field:
+            result.filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+            state["buffer"] = None
+        else:
+            state["buffer"] = bytearray()
+
+    def on_part_data(data, start, end):
+        if state["name"] == file_field:
+            result.size += end - start
+            if result.size > max_bytes:
+                raise UploadRejected(413, f"Upload exceeds {max_bytes} bytes")
+            pending.append(bytes(data[start:end]))
+        elif state["buffer"] is not None:
+            state["buffer"] += data[start:end]
+            if len(state["buffer"]) > FIELD_MAX_BYTES:
+                raise UploadRejected(413, f"Form field {state['name']!r} is too large")
+
+    def on_part_end():
+        if state["buffer"] is not None and state["name"]:
+            result.fields[state["name"]] = state["buffer"].decode("utf-8", "replace")
+        state["buffer"] = None
+
+    def on_end():
+        state["ended"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    result.tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+    fh = open(result.tmp_path, "wb")
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if pending:
+                # 写盘放到线程池，避免大文件阻塞事件循环里的其他请求
+                data = b"".join(pending)
+                pending.clear()
+                await run_in_threadpool(fh.write, data)
+        parser.finalize()
+    except UploadRejected:
+        fh.close()
+        result.discard()
+        raise
+    except Exception as exc:
+        fh.close()
+        result.discard()
+        raise UploadRejected(400, f"Malformed multipart body: {exc}")
+    fh.close()
+
+    # MultipartParser.finalize() 不检查结束边界：连接中断时只收到半个文件，不能当作完整上传
+    if not state["ended"]:
+        result.discard()
+        raise UploadRejected(400, "Incomplete multipart body: missing closing boundary")
+    if result.filename is None:
+        result.discard()
+        raise UploadRejected(400, f"Missing form field {file_field!r}")
+    return result
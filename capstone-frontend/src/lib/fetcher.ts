@@ -20,29 +20,58 @@ const getApiBaseUrl = () => {
 
 const API_BASE_URL = getApiBaseUrl();
 
+// 静态导出（POST /export/static）生成的指针文件：story id -> 带哈希的文件名
+async function fetchExportedStory(): Promise<Story | null> {
+  try {
+    const indexResponse = await fetch('/stories/index.json', { cache: 'no-cache' });
+    if (!indexResponse.ok) {
+      return null;
+    }
+    const index = await indexResponse.json();
+    const entry = index.stories?.[String(index.latest)];
+    if (!entry?.file) {
+      return null;
+    }
+    const storyResponse = await fetch(`/stories/${entry.file}`);
+    return storyResponse.ok ? ((await storyResponse.json()) as Story) : null;
+  } catch {
+    return null;
+  }
+}
+
 export async function fetchStory(): Promise<Story> {
   try {
     // 优先从后端数据库获取
     const response = await fetch(`${API_BASE_URL}/story`);
-    
+
     if (response.ok) {
       const story: Story = await response.json();
       console.log('✓ Story loaded from database');
       return story;
     }
-    
-    // 如果数据库没有数据，回退到本地 story.json
-    console.log('⚠ Database empty, falling back to local story.json');
+    console.log(`⚠ API returned ${response.status}, falling back to static files`);
+  } catch (error) {
+    // 后端不可达（网络错误 / 冷启动超时）时同样回退到静态文件
+    console.warn('⚠ API unreachable, falling back to static files:', error);
+  }
+
+  // 先尝试静态导出的哈希文件，再回退到本地 story.json
+  const exported = await fetchExportedStory();
+  if (exported) {
+    return exported;
+  }
+
+  try {
     const fallbackResponse = await fetch('/story.json');
-    
+
     if (!fallbackResponse.ok) {
       throw new Error(`HTTP error! status: ${fallbackResponse.status}`);
     }
-    
+
     const story: Story = await fallbackResponse.json();
     return story;
   } catch (error) {
     console.error('Failed to fetch story:', error);
     throw error;
   }
-}
\ No newline at end of file
+}
@@ -13,6 +13,14 @@ export interface Theme {
   primaryColor: string;
 }
 
+// 后端根据上传时解析的媒体头部信息合并进来的字段（可能缺失）
+export interface MediaMetadata {
+  width?: number;
+  height?: number;
+  duration?: number;  // 秒，仅视频
+  size?: number;      // 字节数
+}
+
 export type Section = 
   | VideoSection 
   | ParagraphSection 
@@ -22,7 +30,7 @@ export type Section =
   | HeroSection
   | ScrollytellingSection;
 
-export interface VideoSection {
+export interface VideoSection extends MediaMetadata {
   type: 'video';
   src: string;
   poster: string;
@@ -44,7 +52,7 @@ export interface PullQuoteSection {
   attribution?: string;
 }
 
-export interface ImageSection {
+export interface ImageSection extends MediaMetadata {
   type: 'image';
   src: string;
   alt: string;
@@ -74,7 +82,7 @@ export interface HeroSection {
   alignment?: 'left' | 'center';
 }
 
-export interface ImageData {
+export interface ImageData extends MediaMetadata {
   src: string;
   alt: string;
   caption?: string;
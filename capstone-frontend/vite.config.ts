@@ -7,7 +7,11 @@ export default defineConfig({
   server: {
     port: 5173,
     host: true, // 允许外部访问
-    open: true  // 自动打开浏览器
+    open: true, // 自动打开浏览器
+    fs: {
+      // 后端上传的临时目录在 public 旁边；前四项是 Vite 的默认值（设置 deny 会覆盖默认值）
+      deny: ['.env', '.env.*', '*.{crt,pem}', '**/.git/**', '**/.upload-tmp/**']
+    }
   },
   build: {
     outDir: 'dist',